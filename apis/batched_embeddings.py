@@ -0,0 +1,200 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from langchain_core.embeddings import Embeddings
+
+logging.basicConfig(level=logging.INFO)
+
+# 可重試的 HTTP 狀態碼：流量限制與伺服器錯誤
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LatencyStats:
+    """記錄最近請求的延遲，用於觀察 embedding 服務的狀態。"""
+
+    def __init__(self, window=1000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.errors = 0
+
+    def record(self, seconds, num_texts, ok=True):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+            self.texts += num_texts
+            self.errors += 0 if ok else 1
+
+    def snapshot(self):
+        """返回請求數、文字數、錯誤數與最近請求的平均及 p95 延遲（毫秒）。"""
+        with self._lock:
+            latencies_ms = sorted(latency * 1000 for latency in self._latencies)
+            stats = {'requests': self.requests, 'texts': self.texts, 'errors': self.errors}
+        if latencies_ms:
+            stats['mean_ms'] = round(sum(latencies_ms) / len(latencies_ms), 2)
+            stats['p95_ms'] = round(latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))], 2)
+        return stats
+
+
+def embed_queries(embeddings, texts, max_workers=4):
+    """
+    以問題的路徑（embed_query 的前綴與正規化）一次嵌入多個問題。
+
+    模型提供 embed_queries 時直接使用，否則以執行緒並行呼叫 embed_query；
+    不可改用 embed_documents，部分模型（例如 Ollama 的 bge-m3）文件與問題的前綴不同。
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if hasattr(embeddings, 'embed_queries'):
+        return embeddings.embed_queries(texts)
+    if len(texts) == 1:
+        return [embeddings.embed_query(texts[0])]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(texts)), thread_name_prefix='embed-query') as executor:
+        return list(executor.map(embeddings.embed_query, texts))
+
+
+class OllamaPooledEmbeddings(Embeddings):
+    """
+    經由 EndpointPool 分配主機的 Ollama embedding 模型。
+
+    向量與 langchain 的 OllamaEmbeddings 一致：文件加上 "passage: "、問題加上 "query: " 前綴，
+    以 /api/embeddings 取得未正規化的向量，既有的向量資料庫不需重新建立。
+    /api/embeddings 每次請求只接受一段文字（可批次的 /api/embed 會正規化向量，與既有向量不一致），
+    因此一批文字以最多 max_concurrency 個並行請求送出，每段文字各自分配主機並在失敗時改送其他主機。
+    """
+
+    def __init__(self, pool, model, session=None, timeout=120, max_concurrency=4,
+                 embed_instruction="passage: ", query_instruction="query: "):
+        """
+        參數:
+            pool (EndpointPool): 提供此模型的主機池。
+            model (str): embedding 模型名稱。
+            session (requests.Session, optional): 共用的 HTTP session。
+            timeout (int): 每次請求的逾時秒數。
+            max_concurrency (int): 同時送往主機池的請求數量上限（所有呼叫共用）。
+            embed_instruction (str): 文件的前綴，與 OllamaEmbeddings 相同。
+            query_instruction (str): 問題的前綴，與 OllamaEmbeddings 相同。
+        """
+        self.pool = pool
+        self.model = model
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.embed_instruction = embed_instruction
+        self.query_instruction = query_instruction
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='ollama-embed')
+
+    def _post(self, host, text):
+        response = self.session.post(
+            f"{host}/api/embeddings",
+            json={'model': self.model, 'prompt': text},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()['embedding']
+
+    def _embed_one(self, text):
+        return self.pool.call(lambda host: self._post(host, text))
+
+    def _embed(self, texts):
+        if len(texts) <= 1:
+            return [self._embed_one(text) for text in texts]
+        return list(self._executor.map(self._embed_one, texts))
+
+    def embed_documents(self, texts):
+        return self._embed([f"{self.embed_instruction}{text}" for text in texts])
+
+    def embed_query(self, text):
+        return self._embed_one(f"{self.query_instruction}{text}")
+
+    def embed_queries(self, texts):
+        """以問題前綴並行嵌入多個問題。"""
+        return self._embed([f"{self.query_instruction}{text}" for text in texts])
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    將大量文字切成固定大小的批次，以有限的並行數量送往 embedding 模型，
+    遇到 429 或 5xx 錯誤時以指數退避重試。
+    """
+
+    def __init__(self, embeddings, batch_size=32, max_concurrency=4, max_retries=5, backoff_seconds=0.5,
+                 queries_as_documents=False):
+        """
+        參數:
+            embeddings (Embeddings): 實際計算向量的 embedding 模型。
+            batch_size (int): 每次請求的文字數量。
+            max_concurrency (int): 同時進行的請求數量上限。
+            max_retries (int): 每個批次的最大重試次數。
+            backoff_seconds (float): 第一次重試前的等待秒數，之後每次加倍。
+            queries_as_documents (bool): 模型的 embed_query 與 embed_documents 結果相同（例如 OpenAI），
+                批次問題可直接以 embed_documents 一次請求計算。
+        """
+        self.embeddings = embeddings
+        self.queries_as_documents = queries_as_documents
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.stats = LatencyStats()
+
+    def embed_documents(self, texts):
+        return self._map_batches(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text):
+        return self._with_retry(self.embeddings.embed_query, text, 1)
+
+    def embed_queries(self, texts):
+        """以問題的路徑批次嵌入多個問題（見 embed_queries）。"""
+        if self.queries_as_documents:
+            return self._map_batches(self.embeddings.embed_documents, texts)
+        return self._map_batches(lambda batch: embed_queries(self.embeddings, batch, self.max_concurrency), texts)
+
+    def _map_batches(self, func, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return self._with_retry(func, texts, len(texts)) if texts else []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            results = executor.map(lambda batch: self._with_retry(func, batch, len(batch)), batches)
+            return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _with_retry(self, func, arg, num_texts):
+        for attempt in range(self.max_retries + 1):
+            start_time = time.perf_counter()
+            try:
+                result = func(arg)
+                self.stats.record(time.perf_counter() - start_time, num_texts)
+                return result
+            except Exception as e:
+                self.stats.record(time.perf_counter() - start_time, num_texts, ok=False)
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_after(e) or self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                logging.warning(f"Embedding 請求失敗，{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})：{e}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _status_code(error):
+        response = getattr(error, 'response', None)
+        return getattr(response, 'status_code', None) or getattr(error, 'status_code', None)
+
+    @classmethod
+    def _is_retryable(cls, error):
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+        return cls._status_code(error) in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def _retry_after(error):
+        """伺服器有回傳 Retry-After 時依其指示等待。"""
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
@@ -1,55 +1,172 @@
-from langchain_community.embeddings import OllamaEmbeddings
 from langchain_openai import AzureOpenAIEmbeddings
 from dotenv import load_dotenv
+import logging
 import os
+import threading
+import time
+from apis.batched_embeddings import OllamaPooledEmbeddings, BatchedEmbeddings
+from apis.embedding_cache import CachedEmbeddings
+from apis.embedding_profiles import EmbeddingProfile
+from apis.endpoint_pool import EndpointPool
+from apis.local_embeddings import HashingEmbeddings
 
 
 class EmbeddingAPI:
+    # 內部 Ollama 每次請求的文字數量與同時請求數，預設將 64 個文檔塊分成 4 個並行請求
+    INTERNAL_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+    INTERNAL_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+    # 不需網路的本地 embedding，供測試與基準測試使用，與 mode 無關
+    LOCAL_EMBEDDINGS = {
+        'local-hash': lambda: HashingEmbeddings(dimensions=384),
+        'local-hash-768': lambda: HashingEmbeddings(dimensions=768),
+    }
+
+    # 內部 Ollama 文件與問題的前綴，與 langchain 的 OllamaEmbeddings 相同；前綴決定向量空間，也是快取鍵值的一部分
+    INTERNAL_INSTRUCTIONS = {'embed_instruction': "passage: ", 'query_instruction': "query: "}
+
+    # 啟動時預先載入的 (mode, embedding) 組合
+    WARMUP_MODELS = [('內部LLM', 'bge-m3')]
+
+    # 行程內共用的 embedding 客戶端，鍵值為 (mode, embedding, dimensions)
+    _clients = {}
+    _clients_lock = threading.Lock()
+    _env_loaded = False
+
+    @staticmethod
+    def get_embedding_function(mode, embedding, dimensions=None):
+        """
+        取得 embedding 客戶端。
+
+        相同的 (mode, embedding, dimensions) 共用同一個客戶端，保留 HTTP 連線，
+        每次查詢不必重新建立連線與客戶端；客戶端外層加上共用的 embedding 快取與查詢向量快取。
+        dimensions 必須與向量資料庫建立時的維度相同，None 為模型原生維度（見 models/vector_store_profile.py）。
+        """
+        profile = EmbeddingProfile.for_model(embedding, dimensions)
+        key = (mode, embedding, profile.dimensions)
+        with EmbeddingAPI._clients_lock:
+            client = EmbeddingAPI._clients.get(key)
+            if client is None and embedding in EmbeddingAPI.LOCAL_EMBEDDINGS:
+                # 本地計算比讀取快取更快，不加快取
+                client = EmbeddingAPI.LOCAL_EMBEDDINGS[embedding]()
+                EmbeddingAPI._clients[key] = client
+            elif client is None:
+                client = CachedEmbeddings(EmbeddingAPI._create_embedding_function(mode, embedding, profile.dimensions),
+                                          model_name=EmbeddingAPI._cache_key(profile, EmbeddingAPI._instructions(mode)),
+                                          storage_dtype=profile.storage_dtype)
+                EmbeddingAPI._clients[key] = client
+            return client
+
+    @staticmethod
+    def _instructions(mode):
+        """模型的文件與問題前綴，外部模型不加前綴。"""
+        return EmbeddingAPI.INTERNAL_INSTRUCTIONS if mode == '內部LLM' else {}
+
     @staticmethod
-    def get_embedding_function(mode, embedding):
-        """選擇內部或外部 LLM 模型來獲取 embeddings"""
+    def _cache_key(profile, instructions):
+        """
+        embedding 快取中的模型名稱：模型與輸出維度，加上文件與問題的前綴。
+
+        前綴不同的向量位於不同的向量空間，不可共用快取。
+        """
+        if not instructions:
+            return profile.cache_key
+        return f"{profile.cache_key}|{instructions['embed_instruction']}|{instructions['query_instruction']}"
+
+    @staticmethod
+    def warmup(models=None):
+        """
+        預先建立客戶端並送出一次請求，讓 embedding 服務載入模型。
+
+        返回:
+            dict: 每個模型的預熱耗時（秒），失敗時為 None。
+        """
+        results = {}
+        for mode, embedding in models or EmbeddingAPI.WARMUP_MODELS:
+            start_time = time.perf_counter()
+            try:
+                EmbeddingAPI.get_embedding_function(mode, embedding).embed_query("warmup")
+                results[f"{mode}/{embedding}"] = round(time.perf_counter() - start_time, 3)
+            except Exception as e:
+                logging.warning(f"預熱 embedding 模型 {embedding} 失敗：{e}")
+                results[f"{mode}/{embedding}"] = None
+        logging.info(f"Embedding 模型預熱完成：{results}")
+        return results
+
+    @staticmethod
+    def get_latency_stats():
+        """返回各 embedding 客戶端的請求數、延遲與查詢向量快取的統計。"""
+        with EmbeddingAPI._clients_lock:
+            clients = dict(EmbeddingAPI._clients)
+        return {
+            f"{mode}/{embedding}" + (f"@{dimensions}" if dimensions else ""): {
+                **client.embeddings.stats.snapshot(), 'query_cache': client.query_cache.stats()
+            }
+            for (mode, embedding, dimensions), client in clients.items()
+            if embedding not in EmbeddingAPI.LOCAL_EMBEDDINGS
+        }
+
+    @staticmethod
+    def _load_env():
+        """只在第一次使用外部模型時載入 .env。"""
+        if not EmbeddingAPI._env_loaded:
+            load_dotenv()
+            EmbeddingAPI._env_loaded = True
+
+    @staticmethod
+    def _create_embedding_function(mode, embedding, dimensions=None):
+        """選擇內部或外部 LLM 模型來獲取 embeddings，dimensions 為 None 時使用模型原生維度"""
         if mode == '內部LLM':
             # embedding = 'text-embedding-ada-002'
             # return EmbeddingAPI._get_external_embeddings(embedding)
             return EmbeddingAPI._get_internal_embeddings(embedding)
         else:
 
-            return EmbeddingAPI._get_external_embeddings(embedding)
+            return EmbeddingAPI._get_external_embeddings(embedding, dimensions)
 
     @staticmethod
     def _get_internal_embeddings(embedding):
         """獲取內部 LLM 模型的 embeddings"""
-        # 定義內部可用的 embedding 模型與 base_url
+        # 定義內部可用的 embedding 模型與提供該模型的主機
         embedding_models = {
-            "llama3": "http://10.5.61.81:11435",
-            "bge-m3": "http://10.5.63.216:11438"
+            "llama3": ["http://10.5.61.81:11435"],
+            "bge-m3": ["http://10.5.63.216:11438", "http://10.5.61.81:11433"]
         }
         # 檢查模型名稱是否有效
-        base_url = embedding_models.get(embedding)
-        if not base_url:
+        hosts = embedding_models.get(embedding)
+        if not hosts:
             raise ValueError(f"無效的內部 embeddings 模型名稱：{embedding}")
 
-        # 建立並返回 OllamaEmbeddings 實例
-        embeddings = OllamaEmbeddings(base_url=base_url, model=embedding)
-        return embeddings
+        # 請求分配到最空閒的主機，並以固定批次大小限制同時送往伺服器的請求數量
+        return BatchedEmbeddings(
+            OllamaPooledEmbeddings(EndpointPool.for_model(embedding, hosts), model=embedding,
+                                   max_concurrency=EmbeddingAPI.INTERNAL_MAX_CONCURRENCY,
+                                   **EmbeddingAPI.INTERNAL_INSTRUCTIONS),
+            batch_size=EmbeddingAPI.INTERNAL_BATCH_SIZE,
+            max_concurrency=EmbeddingAPI.INTERNAL_MAX_CONCURRENCY
+        )
 
     @staticmethod
-    def _get_external_embeddings(embedding):
+    def _get_external_embeddings(embedding, dimensions=None):
         """獲取外部 Azure 模型的 embeddings"""
         # 加载 .env 文件中的环境变量
-        load_dotenv()
+        EmbeddingAPI._load_env()
 
         # 从环境变量中获取 API Key、Endpoint 和 API 版本
         api_key = os.getenv("AZURE_OPENAI_API_KEY")
         api_base = os.getenv("AZURE_OPENAI_ENDPOINT")
         embedding_api_version = os.getenv("Embedding_API_VERSION")
 
+        # 只有 text-embedding-3 模型支援縮減輸出維度，其他模型使用原生維度
+        profile = EmbeddingProfile.for_model(embedding, dimensions)
+
         # 使用 Azure OpenAI API 來建立 embeddings
         embeddings = AzureOpenAIEmbeddings(
             model=embedding,
             azure_endpoint=api_base,
             api_key=api_key,
             openai_api_version=embedding_api_version,
-            # dimensions: Optional[int] = None  # 可選擇指定新 text-embedding-3 模型的維度
+            dimensions=profile.dimensions,
         )
-        return embeddings
+        # Azure 單次請求可容納較多文字，遇到 429 時退避重試；問題與文件的向量相同，批次問題可一次請求
+        return BatchedEmbeddings(embeddings, batch_size=256, max_concurrency=2, queries_as_documents=True)
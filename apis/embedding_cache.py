@@ -0,0 +1,325 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from apis.batched_embeddings import embed_queries
+from apis.file_paths import FilePaths
+
+logging.basicConfig(level=logging.INFO)
+
+
+class EmbeddingCache:
+    """
+    以內容定址的持久化 embedding 快取，鍵值為 (embedding 模型, 文字的 sha256)。
+
+    快取存放於 data/cache/embedding_cache.db，所有使用者與對話共用；
+    向量可依 embedding 設定以 float32、float16 或 int8（每個向量一個縮放係數）存放，
+    總容量超過 max_bytes 時，依最後存取時間淘汰最久未使用的向量。
+    """
+
+    def __init__(self, db_path=None, max_bytes=1024 ** 3):
+        """
+        參數:
+            db_path (Path, optional): SQLite 檔案路徑，預設為 data/cache/embedding_cache.db。
+            max_bytes (int): 快取向量的總容量上限（位元組）。
+        """
+        self.db_path = db_path or FilePaths().get_cache_dir().joinpath('embedding_cache.db')
+        self.max_bytes = max_bytes
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _init_db(self):
+        """建立快取資料表。"""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT,
+                    text_hash TEXT,
+                    vector BLOB,
+                    nbytes INTEGER,
+                    last_access REAL,
+                    dtype TEXT DEFAULT 'float32',
+                    PRIMARY KEY (model, text_hash)
+                )
+            ''')
+            # 舊版快取沒有 dtype 欄位，既有向量皆為 float32
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(embeddings)')]
+            if 'dtype' not in columns:
+                conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT DEFAULT 'float32'")
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)')
+            # 以一列紀錄保存向量總容量，寫入時不必掃描整個資料表
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_meta (key, value) "
+                "SELECT 'total_bytes', COALESCE(SUM(nbytes), 0) FROM embeddings"
+            )
+
+    @staticmethod
+    def hash_text(text):
+        """計算文字內容的 sha256。"""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model, text_hashes, dtype=None):
+        """
+        批次查詢快取，返回 {text_hash: vector} 的字典，並更新最後存取時間。
+
+        指定 dtype 時只返回以該格式存放的向量，先前以其他格式存放的向量視為未命中，
+        由呼叫端重新嵌入後覆寫。
+        """
+        found = {}
+        text_hashes = list(dict.fromkeys(text_hashes))
+        with self._connect() as conn:
+            # SQLite 單一查詢的參數數量有限，分批查詢
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT text_hash, vector, dtype FROM embeddings '
+                    f'WHERE model = ? AND text_hash IN ({placeholders})',
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob, stored_dtype in rows:
+                    stored_dtype = stored_dtype or 'float32'
+                    if dtype is None or stored_dtype == dtype:
+                        found[text_hash] = self._decode(blob, stored_dtype)
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    'UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?',
+                    [(now, model, text_hash) for text_hash in found]
+                )
+        return found
+
+    def put_many(self, model, items, dtype='float32'):
+        """批次寫入 {text_hash: vector}，寫入後若超過容量上限則進行淘汰。"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for text_hash, vector in items.items():
+            blob = self._encode(vector, dtype)
+            rows.append((model, text_hash, blob, len(blob), now, dtype))
+
+        with self._connect() as conn:
+            # 覆寫既有向量時只計入容量的差值
+            replaced_bytes = 0
+            text_hashes = list(items)
+            for start in range(0, len(text_hashes), 500):
+                batch = text_hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                replaced_bytes += conn.execute(
+                    f'SELECT COALESCE(SUM(nbytes), 0) FROM embeddings '
+                    f'WHERE model = ? AND text_hash IN ({placeholders})',
+                    [model, *batch]
+                ).fetchone()[0]
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (model, text_hash, vector, nbytes, last_access, dtype) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._add_total_bytes(conn, sum(row[3] for row in rows) - replaced_bytes)
+            self._evict(conn)
+
+    @staticmethod
+    def _add_total_bytes(conn, delta):
+        conn.execute("UPDATE cache_meta SET value = value + ? WHERE key = 'total_bytes'", (delta,))
+
+    def _evict(self, conn):
+        """依最後存取時間淘汰向量，直到總容量低於上限的九成。"""
+        total_bytes = conn.execute("SELECT value FROM cache_meta WHERE key = 'total_bytes'").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        target_bytes = int(self.max_bytes * 0.9)
+        freed, evicted = 0, []
+        for model, text_hash, nbytes in conn.execute(
+                'SELECT model, text_hash, nbytes FROM embeddings ORDER BY last_access'):
+            if total_bytes - freed <= target_bytes:
+                break
+            freed += nbytes
+            evicted.append((model, text_hash))
+
+        conn.executemany('DELETE FROM embeddings WHERE model = ? AND text_hash = ?', evicted)
+        self._add_total_bytes(conn, -freed)
+        logging.info(f"Evicted {len(evicted)} cached embeddings ({freed} bytes)")
+
+    @staticmethod
+    def _encode(vector, dtype='float32'):
+        vector = np.asarray(vector, dtype=np.float32)
+        if dtype == 'int8':
+            # 對稱量化：前 4 bytes 為 float32 縮放係數
+            scale = float(np.abs(vector).max()) / 127 if vector.size else 0.0
+            quantized = np.round(vector / scale) if scale else np.zeros_like(vector)
+            return np.float32(scale).tobytes() + quantized.astype(np.int8).tobytes()
+        return vector.astype(dtype).tobytes()
+
+    @staticmethod
+    def _decode(blob, dtype='float32'):
+        if dtype == 'int8':
+            scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+            return (np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale).tolist()
+        return np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+
+
+class QueryEmbeddingCache:
+    """
+    查詢向量的 LRU 快取，鍵值為 (embedding 模型, 正規化後的問題)。
+
+    同一個問題（含全形半形、空白不同的寫法）重複查詢時不必再呼叫 embedding 服務；
+    設定 disk_cache 時，記憶體中沒有的向量會再查詢磁碟快取，服務重新啟動後仍可命中。
+    """
+
+    def __init__(self, max_entries=1024, disk_cache=None):
+        """
+        參數:
+            max_entries (int): 記憶體中保留的查詢向量數量。
+            disk_cache (EmbeddingCache, optional): 磁碟快取，未設定時只使用記憶體。
+        """
+        self.max_entries = max_entries
+        self.disk_cache = disk_cache
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text):
+        """以 NFKC 統一全形半形，並合併多餘的空白。"""
+        return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text)).strip()
+
+    def get_or_compute(self, model, text, compute):
+        """
+        取得查詢向量，快取中沒有時以 compute(正規化後的問題) 計算並寫入快取。
+        """
+        return self.get_or_compute_many(model, [text], lambda texts: [compute(texts[0])])[0]
+
+    def get_or_compute_many(self, model, texts, compute_many):
+        """
+        批次取得查詢向量，快取中沒有的問題以一次 compute_many(正規化後的問題列表) 計算並寫入快取。
+        """
+        normalized = [self.normalize(text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for text in dict.fromkeys(normalized):
+                vector = self._entries.get((model, text))
+                if vector is not None:
+                    self._entries.move_to_end((model, text))
+                    self.hits += 1
+                    vectors[text] = vector
+
+        # 查詢向量與文檔塊向量分開存放，避免正規化後的文字與文檔塊內容混用
+        disk_model = f"query:{model}"
+        missing = [text for text in dict.fromkeys(normalized) if text not in vectors]
+        if missing and self.disk_cache is not None:
+            text_hashes = {EmbeddingCache.hash_text(text): text for text in missing}
+            found = self.disk_cache.get_many(disk_model, list(text_hashes))
+            vectors.update({text_hashes[text_hash]: vector for text_hash, vector in found.items()})
+            missing = [text for text in missing if text not in vectors]
+            with self._lock:
+                self.disk_hits += len(found)
+
+        if missing:
+            computed = dict(zip(missing, compute_many(missing)))
+            vectors.update(computed)
+            with self._lock:
+                self.misses += len(missing)
+            if self.disk_cache is not None:
+                self.disk_cache.put_many(disk_model, {EmbeddingCache.hash_text(text): vector
+                                                      for text, vector in computed.items()})
+
+        with self._lock:
+            for text, vector in vectors.items():
+                self._entries[(model, text)] = vector
+                self._entries.move_to_end((model, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [vectors[text] for text in normalized]
+
+    def stats(self):
+        """返回命中、磁碟命中、未命中次數與目前的項目數量。"""
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'size': len(self._entries)}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    在 embedding 模型前加上 EmbeddingCache 的包裝器。
+
+    embed_documents 只會將快取中不存在的文字送往實際的 embedding 模型，
+    重複上傳相同文件時只需讀取磁碟，不必再次呼叫 embedding 服務；
+    embed_query 則經由 QueryEmbeddingCache，重複的問題不必再次嵌入。
+    """
+
+    def __init__(self, embeddings, model_name, cache=None, query_cache=None, storage_dtype='float32'):
+        """
+        參數:
+            embeddings (Embeddings): 實際計算向量的 embedding 模型。
+            model_name (str): embedding 模型名稱（含輸出維度），作為快取鍵值的一部分。
+            cache (EmbeddingCache, optional): 快取實例，預設使用共用快取。
+            query_cache (QueryEmbeddingCache, optional): 查詢向量快取，預設以 cache 作為磁碟層。
+            storage_dtype (str): 向量在快取中的儲存格式。
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.storage_dtype = storage_dtype
+        self.cache = cache or get_shared_embedding_cache()
+        self.query_cache = query_cache or QueryEmbeddingCache(disk_cache=self.cache)
+
+    def embed_documents(self, texts):
+        text_hashes = [EmbeddingCache.hash_text(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, text_hashes, dtype=self.storage_dtype)
+        hits = len(vectors)
+
+        # 只嵌入快取中缺少的文字，重複內容只計算一次
+        missing = {}
+        for text_hash, text in zip(text_hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(self.model_name, computed, dtype=self.storage_dtype)
+            vectors.update(computed)
+
+        logging.info(f"Embedding cache {self.model_name}: {hits} hits, {len(missing)} misses")
+        return [vectors[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text):
+        return self.query_cache.get_or_compute(self.model_name, text, self.embeddings.embed_query)
+
+    def embed_queries(self, texts):
+        """
+        一次嵌入多個問題並寫入查詢向量快取，之後對同一問題的 embed_query 直接命中快取。
+        以問題的路徑計算（與 embed_query 相同的前綴），不可用 embed_documents。
+        """
+        return self.query_cache.get_or_compute_many(self.model_name, texts,
+                                                    lambda missing: embed_queries(self.embeddings, missing))
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_embedding_cache():
+    """取得行程內共用的 EmbeddingCache 實例。"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EmbeddingCache()
+        return _shared_cache
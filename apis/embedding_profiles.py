@@ -0,0 +1,67 @@
+import os
+
+# 快取向量的儲存格式
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+# 支援縮減輸出維度的 embedding 模型與其原生維度。
+# text-embedding-3 系列可以 dimensions 參數縮減維度，但已存在的向量資料庫必須沿用建立時的維度，
+# 縮減維度只在設定 EMBEDDING_DIMENSIONS_<模型> 後套用於新建立的向量資料庫（見 models/vector_store_profile.py）。
+# 快取預設以 float32 存放，與直接呼叫 API 的向量完全相同；float16 / int8 須以 EMBEDDING_STORAGE_DTYPE 啟用，
+# 啟用後同一個 collection 會混合量化後的快取向量與原始精度的新向量，應先以 bench_embedding_profiles.py 確認召回率。
+EMBEDDING_PROFILES = {
+    'text-embedding-3-large': {'native_dimensions': 3072},
+    'text-embedding-3-small': {'native_dimensions': 1536},
+}
+
+
+class EmbeddingProfile:
+    """
+    embedding 模型的輸出維度與向量儲存格式。
+
+    維度由呼叫端明確指定（None 為模型原生維度）；新向量資料庫的縮減維度可透過環境變數
+    EMBEDDING_DIMENSIONS_<模型名稱>（模型名稱中的 - 改為 _ 並轉為大寫）啟用，
+    儲存格式預設為 float32，可透過 EMBEDDING_STORAGE_DTYPE 改為 float16 或 int8。
+    """
+
+    def __init__(self, model, dimensions=None, storage_dtype='float32'):
+        """
+        參數:
+            model (str): embedding 模型名稱。
+            dimensions (int, optional): 輸出維度，None 表示使用模型原生維度。
+            storage_dtype (str): 快取中的儲存格式，'float32'、'float16' 或 'int8'。
+        """
+        if storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(f"無效的向量儲存格式：{storage_dtype}")
+        if dimensions and not self.supports_dimensions(model):
+            raise ValueError(f"embedding 模型 {model} 不支援指定輸出維度")
+        self.model = model
+        # 指定原生維度與不指定相同
+        self.dimensions = None if dimensions == self.native_dimensions(model) else dimensions
+        self.storage_dtype = storage_dtype
+
+    @property
+    def cache_key(self):
+        """快取鍵值中的模型名稱，不同維度的向量分開存放。"""
+        return f"{self.model}@{self.dimensions}" if self.dimensions else self.model
+
+    @staticmethod
+    def supports_dimensions(model):
+        return model in EMBEDDING_PROFILES
+
+    @staticmethod
+    def native_dimensions(model):
+        return EMBEDDING_PROFILES.get(model, {}).get('native_dimensions')
+
+    @classmethod
+    def for_model(cls, model, dimensions=None):
+        """取得模型在指定維度下的設定，儲存格式預設為 float32。"""
+        storage_dtype = os.getenv("EMBEDDING_STORAGE_DTYPE") or 'float32'
+        return cls(model, dimensions=dimensions, storage_dtype=storage_dtype)
+
+    @classmethod
+    def new_store_dimensions(cls, model):
+        """新建立的向量資料庫使用的輸出維度：設定 EMBEDDING_DIMENSIONS_<模型> 時縮減，否則為原生維度（None）。"""
+        env_dimensions = os.getenv(f"EMBEDDING_DIMENSIONS_{model.replace('-', '_').upper()}")
+        if not env_dimensions or not cls.supports_dimensions(model):
+            return None
+        return int(env_dimensions) or None
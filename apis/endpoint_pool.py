@@ -0,0 +1,259 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from langchain_core.callbacks import BaseCallbackHandler
+
+logging.basicConfig(level=logging.INFO)
+
+
+class EndpointUnavailable(Exception):
+    """所有提供該模型的主機皆無法使用。"""
+
+
+class EndpointPool:
+    """
+    提供同一個模型的多台 Ollama 主機。
+
+    每次請求選擇健康且進行中請求數最少的主機；請求因連線錯誤或 5xx 失敗時，
+    主機進入冷卻期並改送其他主機。主機的健康狀態以 GET /api/tags 確認，
+    並檢查該主機確實提供此模型，結果快取 health_interval 秒；過期的檢查在背景執行緒進行，
+    請求不等待檢查結果，每台主機同時只有一個檢查。
+
+    主機列表可透過環境變數 OLLAMA_HOSTS_<模型名稱> 覆寫（逗號分隔，模型名稱中的非英數字元改為 _ 並轉為大寫），
+    例如 OLLAMA_HOSTS_BGE_M3=http://10.5.63.216:11438,http://10.5.61.81:11433。
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, model, hosts, health_interval=30, cooldown_seconds=30, health_timeout=2):
+        """
+        參數:
+            model (str): 模型名稱。
+            hosts (list): 主機位址列表，例如 ['http://10.5.63.216:11438']。
+            health_interval (int): 健康檢查結果的有效秒數。
+            cooldown_seconds (int): 請求失敗後暫停使用該主機的秒數。
+            health_timeout (float): 健康檢查的逾時秒數。
+        """
+        if not hosts:
+            raise ValueError(f"模型 {model} 沒有可用的主機")
+        self.model = model
+        self.hosts = [host.rstrip('/') for host in hosts]
+        self.health_interval = health_interval
+        self.cooldown_seconds = cooldown_seconds
+        self.health_timeout = health_timeout
+        self.session = requests.Session()
+        self._outstanding = {host: 0 for host in self.hosts}
+        self._down_until = {host: 0.0 for host in self.hosts}
+        self._checked_at = {host: 0.0 for host in self.hosts}
+        # 背景健康檢查進行中的主機
+        self._checking = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_model(cls, model, default_hosts):
+        """取得行程內共用的主機池，環境變數有設定時以其主機列表為準。"""
+        env_name = "OLLAMA_HOSTS_" + re.sub(r'[^0-9A-Za-z]', '_', model).upper()
+        env_hosts = [host.strip() for host in os.getenv(env_name, '').split(',') if host.strip()]
+        hosts = env_hosts or list(default_hosts)
+        key = (model, tuple(hosts))
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(model, hosts)
+                cls._pools[key] = pool
+            return pool
+
+    def _serves_model(self, tags):
+        names = {m.get('name', '') for m in tags.get('models', [])} | {m.get('model', '') for m in tags.get('models', [])}
+        return any(name == self.model or name.split(':')[0] == self.model
+                   or name == f"{self.model}:latest" for name in names)
+
+    def check_health(self, host):
+        """以 /api/tags 確認主機可連線且提供此模型，並更新主機狀態。"""
+        try:
+            response = self.session.get(f"{host}/api/tags", timeout=self.health_timeout)
+            response.raise_for_status()
+            healthy = self._serves_model(response.json())
+        except Exception as e:
+            logging.warning(f"主機 {host} 健康檢查失敗：{e}")
+            healthy = False
+
+        with self._lock:
+            self._checked_at[host] = time.time()
+            self._down_until[host] = 0.0 if healthy else time.time() + self.cooldown_seconds
+        return healthy
+
+    def check_all(self):
+        """檢查所有主機，返回 {host: 是否健康}。"""
+        return {host: self.check_health(host) for host in self.hosts}
+
+    def _refresh_stale(self, exclude=()):
+        """
+        在背景執行緒重新檢查已過健康檢查有效期、且不在冷卻期內的主機。
+
+        檢查中的主機先在鎖內標記，同時進行的請求不會重複檢查同一台主機；
+        呼叫端不等待檢查結果，沿用目前的主機狀態。
+        """
+        now = time.time()
+        with self._lock:
+            stale = [host for host in self.hosts
+                     if host not in exclude and host not in self._checking
+                     and now - self._checked_at[host] > self.health_interval
+                     and self._down_until[host] <= now]
+            self._checking.update(stale)
+        for host in stale:
+            threading.Thread(target=self._check_in_background, args=(host,), daemon=True,
+                             name='endpoint-health').start()
+
+    def _check_in_background(self, host):
+        try:
+            self.check_health(host)
+        finally:
+            with self._lock:
+                self._checking.discard(host)
+
+    def _partition(self, exclude=()):
+        """返回 (健康的主機依進行中請求數排序, 冷卻中的主機依冷卻結束時間排序)。"""
+        self._refresh_stale(exclude)
+        now = time.time()
+        with self._lock:
+            candidates = [host for host in self.hosts if host not in exclude]
+            healthy = sorted((host for host in candidates if self._down_until[host] <= now),
+                             key=lambda host: self._outstanding[host])
+            cooling = sorted((host for host in candidates if self._down_until[host] > now),
+                             key=lambda host: self._down_until[host])
+        return healthy, cooling
+
+    def ranked(self, exclude=()):
+        """
+        依優先順序列出主機：健康的主機依進行中請求數由少到多，其後為冷卻中的主機依冷卻結束時間排序。
+        """
+        healthy, cooling = self._partition(exclude)
+        return healthy + cooling
+
+    def select(self, exclude=()):
+        """選擇健康且進行中請求數最少的主機（不計入進行中的請求）；全部都在冷卻期時選擇最早結束冷卻的主機。"""
+        hosts = self.ranked(exclude)
+        if not hosts:
+            raise EndpointUnavailable(f"模型 {self.model} 沒有可用的主機")
+        return hosts[0]
+
+    def with_failover(self, factory, exceptions_to_handle=()):
+        """
+        為健康的主機建立 LangChain 模型並依進行中請求數組成 fallbacks，
+        請求遇到連線錯誤或逾時時，在同一次請求內改送下一台主機。
+        冷卻中的主機不列入 fallbacks，只有沒有健康主機時才使用。
+
+        參數:
+            factory (callable): factory(host, callbacks) 返回該主機的模型，callbacks 須傳給模型以追蹤請求數與冷卻。
+            exceptions_to_handle (tuple): 除了 FAILOVER_EXCEPTIONS 之外，也要改送其他主機的例外類型
+                （例如 openai 客戶端的連線錯誤）。
+        """
+        exceptions_to_handle = FAILOVER_EXCEPTIONS + tuple(exceptions_to_handle)
+        healthy, cooling = self._partition()
+        models = [factory(host, [EndpointTrackingHandler(self, host, exceptions_to_handle)])
+                  for host in healthy or cooling]
+        if len(models) == 1:
+            return models[0]
+        return models[0].with_fallbacks(models[1:], exceptions_to_handle=exceptions_to_handle)
+
+    def start_request(self, host):
+        with self._lock:
+            self._outstanding[host] += 1
+
+    def end_request(self, host, ok=True):
+        with self._lock:
+            self._outstanding[host] = max(0, self._outstanding[host] - 1)
+            if not ok:
+                self._down_until[host] = time.time() + self.cooldown_seconds
+        if not ok:
+            logging.warning(f"主機 {host} 請求失敗，暫停使用 {self.cooldown_seconds} 秒")
+
+    @contextmanager
+    def lease(self, exclude=()):
+        """選擇主機並計入進行中的請求，區塊內發生可重試的錯誤時將主機標記為失敗。"""
+        host = self.select(exclude)
+        self.start_request(host)
+        ok = True
+        try:
+            yield host
+        except Exception as e:
+            ok = not is_failover_error(e)
+            raise
+        finally:
+            self.end_request(host, ok)
+
+    def call(self, func):
+        """
+        以 func(host) 送出請求，主機失敗時改用其他主機，每台主機最多嘗試一次。
+        """
+        tried = []
+        last_error = None
+        for _ in range(len(self.hosts)):
+            try:
+                with self.lease(exclude=tried) as host:
+                    tried.append(host)
+                    return func(host)
+            except EndpointUnavailable:
+                break
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+        raise last_error or EndpointUnavailable(f"模型 {self.model} 沒有可用的主機")
+
+    def stats(self):
+        """返回各主機進行中的請求數與是否在冷卻期。"""
+        now = time.time()
+        with self._lock:
+            return {host: {'outstanding': self._outstanding[host], 'healthy': self._down_until[host] <= now}
+                    for host in self.hosts}
+
+
+# 代表主機本身無法連線的例外類型
+FAILOVER_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+
+
+def is_failover_error(error):
+    """連線錯誤、逾時與 5xx 錯誤代表主機本身有問題，應改用其他主機。"""
+    if isinstance(error, FAILOVER_EXCEPTIONS):
+        return True
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None) or getattr(error, 'status_code', None)
+    return isinstance(status_code, int) and status_code >= 500
+
+
+class EndpointTrackingHandler(BaseCallbackHandler):
+    """
+    LangChain callback：LLM 請求開始與結束時更新主機池中進行中的請求數，
+    請求失敗時將主機標記為冷卻。
+    """
+
+    def __init__(self, pool, host, failover_exceptions=()):
+        """
+        參數:
+            pool (EndpointPool): 主機所屬的主機池。
+            host (str): 此模型實例連線的主機。
+            failover_exceptions (tuple): 除了 is_failover_error 之外，也代表主機失敗的例外類型。
+        """
+        self.pool = pool
+        self.host = host
+        self.failover_exceptions = tuple(failover_exceptions)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.pool.start_request(self.host)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.pool.start_request(self.host)
+
+    def on_llm_end(self, response, **kwargs):
+        self.pool.end_request(self.host)
+
+    def on_llm_error(self, error, **kwargs):
+        failed = is_failover_error(error) or isinstance(error, self.failover_exceptions)
+        self.pool.end_request(self.host, ok=not failed)
@@ -22,6 +22,12 @@ class FilePaths:
         """
         return self.base_dir / 'user' / username / conversation_id / 'vector_store'
 
+    def get_ingest_manifest_path(self, username, conversation_id):
+        """
+        獲取對話層級文件處理紀錄 (ingest_manifest) 的路徑。
+        """
+        return self.base_dir / 'user' / username / conversation_id / 'ingest_manifest.json'
+
     def get_output_dir(self):
         """
         獲取輸出目錄 (output_dir) 的路徑。
@@ -39,3 +45,21 @@ class FilePaths:
         獲取開發者目錄 (dev_ops_dir) 的路徑。
         """
         return self.base_dir / 'developer'
+
+    def get_cache_dir(self):
+        """
+        獲取共用快取目錄 (cache_dir) 的路徑。
+        """
+        return self.base_dir / 'cache'
+
+    def get_shared_kb_root(self):
+        """
+        獲取共用知識庫根目錄 (shared_kb_root) 的路徑。
+        """
+        return self.base_dir / 'shared_kb'
+
+    def get_shared_kb_dir(self, kb_name):
+        """
+        獲取指定共用知識庫目錄 (shared_kb_dir) 的路徑，內含 documents、vector_store 與 ingest_manifest.json。
+        """
+        return self.get_shared_kb_root() / kb_name
@@ -2,6 +2,7 @@ from dotenv import load_dotenv
 import os
 from langchain_openai import AzureChatOpenAI
 from langchain_community.llms import Ollama
+from apis.endpoint_pool import EndpointPool
 
 class LLMAPI:
     @staticmethod
@@ -33,25 +34,29 @@ class LLMAPI:
             "Taide-llama3-8b-f16": "jcai/llama3-taide-lx-8b-chat-alpha1:f16"
         }
 
+        # 提供各模型的主機，第一台為主要主機；其他主機經健康檢查確認有此模型後才會分配請求
         llm_api_bases = {
-            # "Qwen2-Alibaba": api_base_34,
-            "Taiwan-llama3-8b": api_base_34,
+            # "Qwen2-Alibaba": [api_base_34],
+            "Taiwan-llama3-8b": [api_base_34, api_base_36],
 
-            "Gemma2": api_base_36,
-            "Gemma2:27b": api_base_36,
+            "Gemma2": [api_base_36, api_base_34],
+            "Gemma2:27b": [api_base_36, api_base_34],
 
-            "Taiwan-llama3-f16": api_base_36,
-            "Taide-llama3-8b-f16": api_base_36
+            "Taiwan-llama3-f16": [api_base_36, api_base_34],
+            "Taide-llama3-8b-f16": [api_base_36, api_base_34]
         }
 
         # 確認選擇的模型是否有效
         model = llm_model_names.get(llm_option)
-        api_base = llm_api_bases.get(llm_option)
         if not model:
             raise ValueError(f"無效的內部模型選項：{llm_option}")
 
+        # 優先使用進行中請求最少的健康主機，連線失敗時在同一次請求內改送其他主機；
+        # callback 追蹤請求數並讓失敗的主機進入冷卻
+        pool = EndpointPool.for_model(model, llm_api_bases[llm_option])
+
         # Ollama 模型實例
-        llm = Ollama(base_url=api_base, model=model)
+        llm = pool.with_failover(lambda api_base, callbacks: Ollama(base_url=api_base, model=model, callbacks=callbacks))
         return llm
 
     @staticmethod
@@ -0,0 +1,72 @@
+import unicodedata
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# splitmix64 的常數，用於將特徵編號打散到各個維度
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(values):
+    """splitmix64：將 uint64 陣列映射為均勻分布的雜湊值。"""
+    values = values + _GOLDEN
+    values = (values ^ (values >> np.uint64(30))) * _MIX_1
+    values = (values ^ (values >> np.uint64(27))) * _MIX_2
+    return values ^ (values >> np.uint64(31))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    不需網路的本地 embedding，將字元 unigram 與 bigram 以雜湊投影到固定維度。
+
+    中文沒有空白分詞，以字元 bigram 作為詞彙特徵；計算全部以 NumPy 向量化，
+    一批文字只需少數幾次陣列運算。結果具決定性，適合基準測試、離線測試與 CI，
+    不代表實際的語意品質。
+    """
+
+    def __init__(self, dimensions=384, sublinear_tf=True):
+        """
+        參數:
+            dimensions (int): 輸出向量的維度。
+            sublinear_tf (bool): 以 log(1 + 次數) 降低高頻字元的權重。
+        """
+        self.dimensions = dimensions
+        self.sublinear_tf = sublinear_tf
+
+    @staticmethod
+    def _features(text):
+        """返回 unigram 與 bigram 的特徵編號（uint64）。"""
+        text = unicodedata.normalize('NFKC', text).lower()
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        if codes.size == 0:
+            return codes
+        # bigram 以兩個字元的碼位組成 64 位元編號，並與 unigram 區隔
+        bigrams = (codes[:-1] << np.uint64(32)) | codes[1:] | np.uint64(1 << 63)
+        return np.concatenate([codes, bigrams])
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        features = [self._features(text) for text in texts]
+        rows = np.repeat(np.arange(len(texts)), [f.size for f in features])
+        hashed = _mix(np.concatenate(features)) if rows.size else np.zeros(0, dtype=np.uint64)
+
+        # 最低位元決定正負號，其餘位元決定維度
+        signs = np.where(hashed & np.uint64(1), 1.0, -1.0)
+        buckets = ((hashed >> np.uint64(1)) % np.uint64(self.dimensions)).astype(np.int64)
+        matrix = np.bincount(rows * self.dimensions + buckets, weights=signs,
+                             minlength=len(texts) * self.dimensions).reshape(len(texts), self.dimensions)
+
+        if self.sublinear_tf:
+            matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        return matrix.astype(np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts):
+        """問題與文件使用相同的向量，一次計算多個問題。"""
+        return self.embed_documents(texts)
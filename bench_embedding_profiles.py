@@ -0,0 +1,141 @@
+import argparse
+import json
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from apis.batched_embeddings import embed_queries
+from apis.embedding_api import EmbeddingAPI
+from apis.embedding_cache import EmbeddingCache
+from apis.embedding_profiles import STORAGE_DTYPES
+from apis.file_paths import FilePaths
+from models.pdf_parser import PDFParser
+from models.text_chunker import TextChunker
+
+
+class EmbeddingProfileBenchmark:
+    """
+    比較不同輸出維度與儲存格式的檢索召回率。
+
+    以原生維度、float32 向量的 top-k 結果為基準，計算縮減維度（截斷後重新正規化，
+    與 text-embedding-3 指定 dimensions 的結果相同）及 float16 / int8 量化後的 recall@k，
+    並列出每個向量佔用的位元組數，作為調整 EmbeddingProfile 的依據。
+    """
+
+    MOCK_PDF_PATH = './mockdata/A_出差辦法bot_原.pdf'
+    QA_PATH = './mockdata/QAData.csv'
+
+    def __init__(self, mode, embedding, dimensions_list, k=3, local=False):
+        """
+        參數:
+            mode (str): '內部LLM' 或 '外部LLM'。
+            embedding (str): embedding 模型名稱。
+            dimensions_list (list): 要比較的輸出維度，大於原生維度者略過。
+            k (int): 計算 recall@k 的 k。
+            local (bool): 使用本地 embedding（local-hash-768），不需連線 embedding 服務。
+        """
+        self.mode = mode
+        self.embedding = embedding
+        self.dimensions_list = dimensions_list
+        self.k = k
+        self.local = local
+        self.output_dir = FilePaths().get_output_dir().joinpath('benchmarks')
+
+    def _embedding_function(self):
+        if self.local:
+            return EmbeddingAPI.get_embedding_function(self.mode, 'local-hash-768')
+        # 以原生維度取得向量（不經過快取），縮減維度在本地模擬
+        return EmbeddingAPI._create_embedding_function(self.mode, self.embedding, dimensions=None)
+
+    def _load_texts(self):
+        pages = PDFParser(max_workers=1).parse_files([self.MOCK_PDF_PATH])
+        chunks = [chunk.page_content for chunk in TextChunker().split_documents(pages)]
+        questions = pd.read_csv(self.QA_PATH)['Question'].dropna().tolist()
+        return chunks, questions
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def _top_k(self, doc_matrix, query_matrix):
+        scores = query_matrix @ doc_matrix.T
+        return np.argsort(-scores, axis=1)[:, :self.k]
+
+    @staticmethod
+    def _quantize(matrix, dtype):
+        """以 EmbeddingCache 的編碼方式存取一次，模擬快取中的精度損失。"""
+        blobs = [EmbeddingCache._encode(vector, dtype) for vector in matrix]
+        decoded = np.array([EmbeddingCache._decode(blob, dtype) for blob in blobs], dtype=np.float32)
+        return decoded, len(blobs[0])
+
+    def run(self):
+        chunks, questions = self._load_texts()
+        embedding_function = self._embedding_function()
+        doc_full = np.array(embedding_function.embed_documents(chunks), dtype=np.float32)
+        query_full = np.array(embed_queries(embedding_function, questions), dtype=np.float32)
+        native_dimensions = doc_full.shape[1]
+        baseline = self._top_k(self._normalize(doc_full), self._normalize(query_full))
+
+        results = []
+        for dimensions in [native_dimensions] + [d for d in self.dimensions_list if d < native_dimensions]:
+            queries = self._normalize(query_full[:, :dimensions])
+            for dtype in STORAGE_DTYPES:
+                docs, bytes_per_vector = self._quantize(self._normalize(doc_full[:, :dimensions]), dtype)
+                start_time = time.perf_counter()
+                top_k = self._top_k(docs, queries)
+                search_ms = (time.perf_counter() - start_time) * 1000
+                recall = np.mean([len(set(found) & set(expected)) / self.k
+                                  for found, expected in zip(top_k, baseline)])
+                results.append({
+                    'dimensions': dimensions,
+                    'dtype': dtype,
+                    f'recall@{self.k}': round(float(recall), 4),
+                    'bytes_per_vector': bytes_per_vector,
+                    'search_ms': round(search_ms, 3),
+                })
+
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'embedding': 'local-hash-768' if self.local else self.embedding,
+            'native_dimensions': native_dimensions,
+            'chunks': len(chunks),
+            'questions': len(questions),
+            'results': results,
+        }
+
+    def save_results(self, results):
+        """將結果存為 JSON 並返回檔案路徑。"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = self.output_dir.joinpath(
+            f"embedding_profiles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        return output_file
+
+
+def main():
+    """
+    主程序執行入口：比較不同 embedding 維度與儲存格式的召回率並儲存結果。
+    """
+    parser = argparse.ArgumentParser(description="embedding 維度與量化的召回率比較")
+    parser.add_argument('--mode', default='外部LLM', help="'內部LLM' 或 '外部LLM'")
+    parser.add_argument('--embedding', default='text-embedding-3-large', help="embedding 模型名稱")
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[1536, 1024, 512, 256],
+                        help="要比較的輸出維度")
+    parser.add_argument('--k', type=int, default=3, help="計算 recall@k 的 k")
+    parser.add_argument('--local', action='store_true', help="使用本地 embedding")
+    args = parser.parse_args()
+
+    print("=== 啟動 embedding 設定比較 ===")
+    benchmark = EmbeddingProfileBenchmark(args.mode, args.embedding, args.dimensions, args.k, args.local)
+    results = benchmark.run()
+    for row in results['results']:
+        print(f"{row['dimensions']:>5} {row['dtype']:<8} recall@{args.k}={row[f'recall@{args.k}']:.4f} "
+              f"{row['bytes_per_vector']} bytes/vector")
+    print(f"結果已儲存至 {benchmark.save_results(results)}")
+    print("=== 比較完成 ===")
+
+
+if __name__ == "__main__":
+    main()
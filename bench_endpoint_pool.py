@@ -0,0 +1,219 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_community.llms import Ollama
+from apis.batched_embeddings import BatchedEmbeddings, OllamaPooledEmbeddings
+from apis.endpoint_pool import EndpointPool
+
+
+class FakeOllamaServer:
+    """
+    本地假 Ollama 主機，供 EndpointPool 的分配與容錯測試使用，不需連線真正的 Ollama。
+
+    /api/tags 回報提供的模型，/api/embeddings 與 /api/generate 回傳固定結果；
+    可設定每次請求的延遲，以及讓 embedding / 生成請求回傳指定的錯誤狀態碼。
+    """
+
+    def __init__(self, models, latency=0.0, fail_status=None):
+        """
+        參數:
+            models (list): /api/tags 回報的模型名稱。
+            latency (float): 每次 embedding / 生成請求的延遲秒數。
+            fail_status (int, optional): embedding / 生成請求回傳的錯誤狀態碼，None 表示正常回應。
+        """
+        self.models = models
+        self.latency = latency
+        self.fail_status = fail_status
+        self.requests = 0
+        self.health_checks = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    with fake._lock:
+                        fake.health_checks += 1
+                    time.sleep(fake.latency)
+                    self._send_json(200, {'models': [{'name': name, 'model': name} for name in fake.models]})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with fake._lock:
+                    fake.requests += 1
+                time.sleep(fake.latency)
+                if fake.fail_status:
+                    self._send_json(fake.fail_status, {'error': 'fake failure'})
+                elif self.path == '/api/embeddings':
+                    self._send_json(200, {'embedding': [float(len(payload.get('prompt', ''))), 1.0]})
+                elif self.path == '/api/generate':
+                    self._send_json(200, {'model': payload.get('model'), 'response': fake.url, 'done': True})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class EndpointPoolBenchmark:
+    """
+    以本地假主機檢查 EndpointPool：請求分配、5xx 與連線失敗時的改送，以及 LLM 請求途中的主機失效。
+    """
+
+    MODEL = 'bge-m3'
+
+    def __init__(self, texts=256, batch_size=16, concurrency=4, latency=0.01):
+        """
+        參數:
+            texts (int): 每個情境嵌入的文字數量。
+            batch_size (int): 每次 embedding 請求的文字數量。
+            concurrency (int): 同時進行的 embedding 請求數量。
+            latency (float): 假主機每次請求的延遲秒數。
+        """
+        self.texts = [f"text {i}" for i in range(texts)]
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.latency = latency
+
+    def _embed(self, pool):
+        embeddings = BatchedEmbeddings(OllamaPooledEmbeddings(pool, model=self.MODEL),
+                                       batch_size=self.batch_size, max_concurrency=self.concurrency,
+                                       max_retries=0)
+        start_time = time.perf_counter()
+        vectors = embeddings.embed_documents(self.texts)
+        return {'ok': len(vectors) == len(self.texts), 'seconds': round(time.perf_counter() - start_time, 3)}
+
+    def _run_servers(self, scenario, servers, extra_hosts=()):
+        for server in servers:
+            server.start()
+        try:
+            pool = EndpointPool(self.MODEL, [server.url for server in servers] + list(extra_hosts),
+                                cooldown_seconds=60)
+            result = scenario(pool)
+        finally:
+            for server in servers:
+                server.stop()
+        result['requests'] = [server.requests for server in servers]
+        return result
+
+    def balance(self):
+        """兩台健康主機：請求應大致平均分配。"""
+        result = self._run_servers(self._embed, [FakeOllamaServer([self.MODEL], self.latency) for _ in range(2)])
+        result['ok'] = result['ok'] and min(result['requests']) > 0
+        return result
+
+    def server_error(self):
+        """一台主機回傳 503：請求改送另一台，全部成功。"""
+        return self._run_servers(self._embed, [FakeOllamaServer([self.MODEL], self.latency, fail_status=503),
+                                               FakeOllamaServer([self.MODEL], self.latency)])
+
+    def host_down(self):
+        """一台主機無法連線：健康檢查排除該主機，全部成功。"""
+        closed = FakeOllamaServer([self.MODEL])
+        closed_url = closed.url
+        closed._server.server_close()
+        return self._run_servers(self._embed, [FakeOllamaServer([self.MODEL], self.latency)],
+                                 extra_hosts=[closed_url])
+
+    def llm_failover(self):
+        """LLM 建立後優先主機才失效：同一次請求內改送另一台主機。"""
+        first, second = FakeOllamaServer([self.MODEL]).start(), FakeOllamaServer([self.MODEL]).start()
+        try:
+            pool = EndpointPool(self.MODEL, [first.url, second.url], cooldown_seconds=60)
+            llm = pool.with_failover(lambda host, callbacks: Ollama(base_url=host, model=self.MODEL, callbacks=callbacks))
+            preferred = pool.select()
+            (first if preferred == first.url else second).stop()
+            answered_by = llm.invoke("ping")
+            return {'ok': answered_by != preferred, 'answered_by': answered_by,
+                    'preferred_healthy': pool.stats()[preferred]['healthy']}
+        finally:
+            for server in (first, second):
+                try:
+                    server.stop()
+                except OSError:
+                    pass
+
+    def health_checks(self):
+        """同時進行的請求不等待健康檢查、每台主機只檢查一次；冷卻中的主機不列入 LLM 的 fallbacks。"""
+        servers = [FakeOllamaServer([self.MODEL], latency=0.5).start() for _ in range(2)]
+        try:
+            pool = EndpointPool(self.MODEL, [server.url for server in servers], cooldown_seconds=60)
+            start_time = time.perf_counter()
+            threads = [threading.Thread(target=pool.ranked) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            ranked_seconds = time.perf_counter() - start_time
+            time.sleep(1.0)
+            checks = [server.health_checks for server in servers]
+
+            pool.end_request(servers[0].url, ok=False)
+            llm = pool.with_failover(lambda host, callbacks: Ollama(base_url=host, model=self.MODEL, callbacks=callbacks))
+            fallback_hosts = [model.base_url for model in getattr(llm, 'fallbacks', [])]
+            return {'ok': ranked_seconds < 0.5 and checks == [1, 1] and servers[0].url not in fallback_hosts,
+                    'ranked_seconds': round(ranked_seconds, 3), 'health_checks': checks,
+                    'fallbacks': len(fallback_hosts)}
+        finally:
+            for server in servers:
+                server.stop()
+
+    def run(self):
+        return {name: getattr(self, name)()
+                for name in ('balance', 'server_error', 'host_down', 'llm_failover', 'health_checks')}
+
+
+def main():
+    """
+    主程序執行入口：以本地假主機檢查主機池的分配與容錯，任何情境失敗時以非零狀態結束。
+    """
+    parser = argparse.ArgumentParser(description="EndpointPool 分配與容錯檢查（本地假主機）")
+    parser.add_argument('--texts', type=int, default=256, help="每個情境嵌入的文字數量")
+    parser.add_argument('--batch-size', type=int, default=16, help="每次 embedding 請求的文字數量")
+    parser.add_argument('--concurrency', type=int, default=4, help="同時進行的 embedding 請求數量")
+    parser.add_argument('--latency', type=float, default=0.01, help="假主機每次請求的延遲秒數")
+    args = parser.parse_args()
+
+    print("=== 啟動主機池檢查 ===")
+    results = EndpointPoolBenchmark(args.texts, args.batch_size, args.concurrency, args.latency).run()
+    for name, result in results.items():
+        print(f"{name:<14} {'OK' if result['ok'] else 'FAIL'}  {result}")
+    print("=== 檢查完成 ===")
+    sys.exit(0 if all(result['ok'] for result in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
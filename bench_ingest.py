@@ -0,0 +1,279 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from apis.embedding_api import EmbeddingAPI
+from apis.file_paths import FilePaths
+from models.document_model import DocumentModel
+from models.parsed_text_cache import ParsedTextCache
+from models.pdf_parser import PDFParser
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組
+    resource = None
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class IngestBenchmark:
+    """
+    文件處理（解析 → 拆分 → 嵌入 → 寫入）的基準測試。
+
+    以 DocumentModel 處理 mockdata 中的範例 PDF 與數種頁數的合成 PDF，
+    預設使用本地 embedding（local-hash），不需連線 embedding 服務；
+    解析階段同時量測實際解析與由解析快取讀取的速度；
+    每個案例在獨立的子行程執行，最高記憶體用量只反映該案例；
+    結果以 JSON 存入 data/output/benchmarks/，方便比較不同版本的效能。
+    """
+
+    # 範例 PDF 路徑
+    MOCK_PDF_PATH = './mockdata/A_出差辦法bot_原.pdf'
+    # 合成 PDF 的頁數
+    SYNTHETIC_PAGE_COUNTS = [10, 50, 200]
+
+    def __init__(self, page_counts=None, parse_workers=None, embed_batch_size=64,
+                 mode='內部LLM', embedding='local-hash'):
+        """
+        參數:
+            page_counts (list, optional): 合成 PDF 的頁數列表。
+            parse_workers (int, optional): PDF 解析的行程數量，預設為 CPU 核心數。
+            embed_batch_size (int): 每次嵌入與寫入的文檔塊數量。
+            mode (str): embedding 的 mode，'內部LLM' 或 '外部LLM'。
+            embedding (str): embedding 模型名稱，預設為本地的 local-hash。
+        """
+        self.page_counts = page_counts or self.SYNTHETIC_PAGE_COUNTS
+        self.parse_workers = parse_workers
+        self.embed_batch_size = embed_batch_size
+        self.mode = mode
+        self.embedding = embedding
+        self.embedding_function = EmbeddingAPI.get_embedding_function(mode, embedding)
+        self.output_dir = FilePaths().get_output_dir().joinpath('benchmarks')
+
+    def run(self):
+        """執行所有測試案例並返回結果。"""
+        cases = []
+        with tempfile.TemporaryDirectory() as work_dir:
+            pdf_files = []
+            if Path(self.MOCK_PDF_PATH).exists():
+                pdf_files.append(('mock_' + Path(self.MOCK_PDF_PATH).stem, Path(self.MOCK_PDF_PATH)))
+            for num_pages in self.page_counts:
+                pdf_path = Path(work_dir).joinpath(f'synthetic_{num_pages}.pdf')
+                self._create_synthetic_pdf(pdf_path, num_pages)
+                pdf_files.append((f'synthetic_{num_pages}p', pdf_path))
+
+            for name, pdf_path in pdf_files:
+                print(f"執行測試案例 {name}...")
+                cases.append(self._bench_case_in_subprocess(name, pdf_path))
+
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': self._git_commit(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'parse_workers': self.parse_workers,
+            'embed_batch_size': self.embed_batch_size,
+            'embedding': self.embedding,
+            'cases': cases,
+        }
+
+    def _bench_case_in_subprocess(self, name, pdf_path):
+        """
+        在新的子行程執行單一測試案例。
+
+        ru_maxrss 是整個行程的峰值，若在同一行程執行所有案例，後面的案例會回報先前案例的峰值。
+        """
+        settings = {
+            'page_counts': self.page_counts,
+            'parse_workers': self.parse_workers,
+            'embed_batch_size': self.embed_batch_size,
+            'mode': self.mode,
+            'embedding': self.embedding,
+        }
+        context = multiprocessing.get_context('spawn')
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_case, args=(sender, settings, name, pdf_path.as_posix()))
+        process.start()
+        sender.close()
+        try:
+            status, result = receiver.recv()
+        except EOFError:
+            process.join()
+            raise RuntimeError(f"Benchmark case {name} exited with code {process.exitcode}")
+        process.join()
+        if status != 'ok':
+            raise RuntimeError(f"Benchmark case {name} failed: {result}")
+        return result
+
+    def _bench_case(self, name, pdf_path):
+        """以一個獨立的暫存對話處理單一 PDF，並量測各階段效能。"""
+        chat_session_data = {
+            'username': 'benchmark',
+            'conversation_id': str(uuid.uuid4()),
+            'parse_workers': self.parse_workers,
+        }
+        doc_model = DocumentModel(chat_session_data)
+        conversation_dir = doc_model.tmp_dir.parent
+        try:
+            doc_model.create_temporary_files([{'name': pdf_path.name, 'content': pdf_path.read_bytes()}])
+
+            # 解析：第一次為實際解析 PDF，第二次由解析快取讀取
+            pending_files = doc_model.list_pending_files()
+            parser = PDFParser(max_workers=self.parse_workers,
+                               cache=ParsedTextCache(conversation_dir.joinpath('parsed_text')))
+            start_time = time.perf_counter()
+            pages = parser.parse_files(list(pending_files), file_hashes=pending_files)
+            parse_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            parser.parse_files(list(pending_files), file_hashes=pending_files)
+            cached_parse_seconds = time.perf_counter() - start_time
+
+            # 拆分
+            start_time = time.perf_counter()
+            document_chunks = doc_model.get_text_chunker().split_documents(pages)
+            split_seconds = time.perf_counter() - start_time
+
+            # 嵌入
+            start_time = time.perf_counter()
+            batches = []
+            for i in range(0, len(document_chunks), self.embed_batch_size):
+                batch = document_chunks[i:i + self.embed_batch_size]
+                batches.append((batch, self.embedding_function.embed_documents([c.page_content for c in batch])))
+            embed_seconds = time.perf_counter() - start_time
+
+            # 寫入
+            vector_db = doc_model.open_local_vectordb(self.embedding_function)
+            upsert_latencies = []
+            for batch, vectors in batches:
+                start_time = time.perf_counter()
+                doc_model.upsert_embedded_chunks(vector_db, batch, vectors)
+                upsert_latencies.append(time.perf_counter() - start_time)
+
+            return {
+                'name': name,
+                'pages': len(pages),
+                'chunks': len(document_chunks),
+                'parse_seconds': round(parse_seconds, 4),
+                'pages_per_sec': self._rate(len(pages), parse_seconds),
+                'cached_parse_seconds': round(cached_parse_seconds, 4),
+                'cached_pages_per_sec': self._rate(len(pages), cached_parse_seconds),
+                'split_seconds': round(split_seconds, 4),
+                'chunks_per_sec': self._rate(len(document_chunks), split_seconds),
+                'embed_seconds': round(embed_seconds, 4),
+                'embeddings_per_sec': self._rate(len(document_chunks), embed_seconds),
+                'upsert_latency_ms': self._latency_summary(upsert_latencies),
+                'peak_rss_mb': self._peak_rss_mb(),
+            }
+        finally:
+            shutil.rmtree(conversation_dir, ignore_errors=True)
+
+    def save_results(self, results):
+        """將結果存為 JSON 並返回檔案路徑。"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = self.output_dir.joinpath(f"ingest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        return output_file
+
+    @staticmethod
+    def _create_synthetic_pdf(pdf_path, num_pages):
+        """以 reportlab 產生含標題與中文段落的合成 PDF。"""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        from reportlab.pdfgen import canvas
+
+        pdfmetrics.registerFont(UnicodeCIDFont('MSung-Light'))
+        pdf = canvas.Canvas(pdf_path.as_posix(), pagesize=A4)
+        sentence = "出差人員應依規定檢附憑證報支交通費、住宿費及膳雜費，計程車費依報支標準表辦理。"
+        for page in range(num_pages):
+            pdf.setFont('MSung-Light', 14)
+            pdf.drawString(50, 800, f"# 第 {page + 1} 章 出差旅費")
+            pdf.setFont('MSung-Light', 10)
+            for line in range(45):
+                pdf.drawString(50, 770 - line * 16, f"{line + 1}. {sentence}")
+            pdf.showPage()
+        pdf.save()
+
+    @staticmethod
+    def _rate(count, seconds):
+        return round(count / seconds, 2) if seconds > 0 else None
+
+    @staticmethod
+    def _latency_summary(latencies):
+        if not latencies:
+            return {'batches': 0}
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        return {
+            'batches': len(latencies_ms),
+            'mean': round(statistics.mean(latencies_ms), 2),
+            'p95': round(latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))], 2),
+            'total': round(sum(latencies_ms), 2),
+        }
+
+    @staticmethod
+    def _peak_rss_mb():
+        """目前行程（含已結束的解析子行程）的最高記憶體用量，單位 MB；每個案例的行程只執行該案例。"""
+        if resource is None:
+            return None
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # Linux 的單位為 KB，macOS 為 bytes
+        divisor = 1024 * 1024 if platform.system() == 'Darwin' else 1024
+        return round(peak / divisor, 1)
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        except Exception:
+            return None
+
+
+def _run_case(sender, settings, name, pdf_path):
+    """子行程的進入點：執行單一測試案例，並將結果傳回主行程。"""
+    try:
+        result = ('ok', IngestBenchmark(**settings)._bench_case(name, Path(pdf_path)))
+    except Exception as e:
+        result = ('error', repr(e))
+    sender.send(result)
+    sender.close()
+
+
+def main():
+    """
+    主程序執行入口：執行文件處理基準測試並儲存結果。
+    """
+    parser = argparse.ArgumentParser(description="文件處理基準測試")
+    parser.add_argument('--pages', type=int, nargs='+', help="合成 PDF 的頁數，例如 --pages 10 50 200")
+    parser.add_argument('--parse-workers', type=int, help="PDF 解析的行程數量")
+    parser.add_argument('--batch-size', type=int, default=64, help="每次嵌入與寫入的文檔塊數量")
+    parser.add_argument('--mode', default='內部LLM', help="embedding 的 mode")
+    parser.add_argument('--embedding', default='local-hash', help="embedding 模型名稱，預設為本地 embedding")
+    args = parser.parse_args()
+
+    print("=== 啟動文件處理基準測試 ===")
+    benchmark = IngestBenchmark(args.pages, args.parse_workers, args.batch_size, args.mode, args.embedding)
+    results = benchmark.run()
+    for case in results['cases']:
+        print(f"{case['name']}: {case['pages_per_sec']} pages/s "
+              f"(cached {case['cached_pages_per_sec']} pages/s), {case['chunks_per_sec']} chunks/s, "
+              f"{case['embeddings_per_sec']} embeddings/s, upsert {case['upsert_latency_ms']}, "
+              f"peak RSS {case['peak_rss_mb']} MB")
+    print(f"結果已儲存至 {benchmark.save_results(results)}")
+    print("=== 測試完成 ===")
+
+
+if __name__ == "__main__":
+    main()
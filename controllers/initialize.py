@@ -49,6 +49,8 @@ class SessionInitializer:
             'db_name': '',
             'db_source': '',
             'chat_history': [],
+            'ingest_job_ids': [],
+            'shared_kbs': [],
             'title': '',
 
             'upload_time': None,
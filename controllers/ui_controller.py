@@ -1,4 +1,5 @@
 from models.database_userRecords import UserRecordsDB
+from models.shared_kb import SharedKnowledgeBase
 import uuid
 
 
@@ -37,6 +38,11 @@ class UIController:
         self.chat_session_data['empty_window_exists'] = True
         return self.chat_session_data
 
+    @staticmethod
+    def list_shared_kbs():
+        """返回可引用的共用知識庫名稱"""
+        return SharedKnowledgeBase.list_names()
+
     def reset_session_state_to_defaults(self):
         """重置 session state 參數至預設值。"""
         reset_session_state = {
@@ -49,7 +55,9 @@ class UIController:
             'db_name': None,
             'db_source': None,
             'title': '',
-            'chat_history': []
+            'chat_history': [],
+            'ingest_job_ids': [],
+            'shared_kbs': []
         }
         for key, value in reset_session_state.items():
             self.chat_session_data[key] = value
@@ -0,0 +1,91 @@
+from datetime import datetime
+from models.database_base import BaseDB
+from apis.file_paths import FilePaths
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+# 文件處理工作的狀態
+JOB_STATUSES = ('queued', 'parsing', 'embedding', 'done', 'failed', 'cancelled')
+# 尚未結束的狀態
+ACTIVE_JOB_STATUSES = ('queued', 'parsing', 'embedding')
+
+
+class IngestJobsDB:
+    def __init__(self):
+        """初始化 IngestJobsDB 類別，記錄背景文件處理工作的狀態與進度。"""
+        # 設定資料庫路徑
+        file_paths = FilePaths()
+        self.db_path = file_paths.get_developer_dir().joinpath('IngestJobsDB.db')
+        self.base_db = BaseDB(self.db_path)
+
+        # 初始化資料庫表格
+        self.base_db.ensure_db_path_exists()
+        self._init_db()
+
+    def _init_db(self):
+        """初始化資料庫，創建必要的表格。"""
+        ingest_jobs_query = '''
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                job_id TEXT PRIMARY KEY,
+                username TEXT,
+                conversation_id TEXT,
+                status TEXT,
+                total_files INTEGER DEFAULT 0,
+                pages INTEGER DEFAULT 0,
+                chunks INTEGER DEFAULT 0,
+                embedded INTEGER DEFAULT 0,
+                upserted INTEGER DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP
+            )
+        '''
+        self.base_db.execute_query(ingest_jobs_query)
+
+    def create_job(self, job_id, username, conversation_id, total_files):
+        """新增一筆排隊中的工作。"""
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.base_db.execute_query(
+            """
+            INSERT INTO ingest_jobs
+            (job_id, username, conversation_id, status, total_files, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', ?, ?, ?)
+            """,
+            (job_id, username, conversation_id, total_files, current_time, current_time)
+        )
+
+    def update_job(self, job_id, status=None, stats=None, error=None):
+        """更新工作的狀態、各階段處理數量與錯誤訊息。"""
+        fields = {'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        if status:
+            fields['status'] = status
+        if stats:
+            fields.update({key: stats.get(key, 0) for key in ('pages', 'chunks', 'embedded', 'upserted')})
+        if error is not None:
+            fields['error'] = error
+
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        try:
+            self.base_db.execute_query(
+                f"UPDATE ingest_jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+        except Exception as e:
+            logging.error(f"更新 IngestJobsDB ({job_id}) 時發生錯誤: {e}")
+
+    def get_job(self, job_id):
+        """取得單一工作的紀錄，以字典返回；不存在時返回 None。"""
+        columns = ['job_id', 'username', 'conversation_id', 'status', 'total_files',
+                   'pages', 'chunks', 'embedded', 'upserted', 'error', 'created_at', 'updated_at']
+        rows = self.base_db.fetch_query(
+            f"SELECT {', '.join(columns)} FROM ingest_jobs WHERE job_id = ?", (job_id,))
+        return dict(zip(columns, rows[0])) if rows else None
+
+    def fail_interrupted_jobs(self):
+        """將服務重新啟動前未完成的工作標記為失敗。"""
+        placeholders = ', '.join('?' * len(ACTIVE_JOB_STATUSES))
+        self.base_db.execute_query(
+            f"UPDATE ingest_jobs SET status = 'failed', error = ? WHERE status IN ({placeholders})",
+            ("服務重新啟動，工作已中斷", *ACTIVE_JOB_STATUSES)
+        )
@@ -1,11 +1,17 @@
 import logging
 import tempfile
-from langchain_community.document_loaders import PyPDFDirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import uuid
 # from langchain_community.vectorstores import Chroma
 from langchain_chroma import Chroma
 from apis.file_paths import FilePaths
 from apis.embedding_api import EmbeddingAPI
+from models.pdf_parser import PDFParser
+from models.ingest_manifest import IngestManifest
+from models.text_chunker import TextChunker
+from models.parsed_text_cache import ParsedTextCache
+from models.vector_store_cache import get_vector_store_cache
+from models.vector_store_profile import VectorStoreProfile
+from models.lexical_index import LexicalIndex
 from pathlib import Path
 import os
 from langchain.schema import Document
@@ -33,13 +39,24 @@ class DocumentModel:
         conversation_id = self.chat_session_data.get("conversation_id")
         self.tmp_dir = self.file_paths.get_tmp_dir(username, conversation_id)
         self.vector_store_dir = self.file_paths.get_local_vector_store_dir(username, conversation_id)
+        # 初始化對話層級的文件處理紀錄
+        self.manifest = IngestManifest(self.file_paths.get_ingest_manifest_path(username, conversation_id))
 
     def create_temporary_files(self, source_docs):
-        """建立臨時文件並返回檔案名稱對應關係。"""
+        """建立臨時文件並返回檔案名稱對應關係，已處理過的相同內容文件會被略過。"""
         self.tmp_dir.mkdir(parents=True, exist_ok=True)
         doc_names = {}
+        indexed_files = self.manifest.indexed_files()
+        seen_hashes = set()
 
         for source_doc in source_docs:
+            # 以內容雜湊判斷文件是否已處理過或在本次上傳中重複
+            file_hash = IngestManifest.hash_bytes(source_doc['content'])
+            if file_hash in indexed_files or file_hash in seen_hashes:
+                logging.info(f"Skipping already indexed file: {source_doc['name']}")
+                continue
+            seen_hashes.add(file_hash)
+
             with tempfile.NamedTemporaryFile(delete=False, dir=self.tmp_dir.as_posix(), suffix='.pdf') as tmp_file:
                 tmp_file.write(source_doc['content'])  # 寫入文件內容
                 file_name = Path(tmp_file.name).name
@@ -48,13 +65,51 @@ class DocumentModel:
 
         return doc_names
 
-    def load_documents(self):
-        # 加載 PDF 文件
-        # 使用 PyPDFDirectoryLoader 從指定的目錄中加載所有 PDF 文件
-        loader = PyPDFDirectoryLoader(self.tmp_dir.as_posix(), glob='**/*.pdf')
+    def list_pending_files(self, file_names=None):
+        """
+        列出暫存目錄中尚未寫入向量資料庫的 PDF 文件，返回 {檔案路徑: 內容雜湊}。
+
+        參數:
+            file_names (iterable, optional): 只列出這些暫存檔名，文件處理工作以此限定為本次上傳的文件。
+        """
+        indexed_files = self.manifest.indexed_files()
+        indexed_names = {record.get('tmp_name') for record in indexed_files.values()}
+        file_names = set(file_names) if file_names is not None else None
+
+        pending_files = {}
+        for file_path in PDFParser.list_pdf_files(self.tmp_dir):
+            if file_names is not None and file_path.name not in file_names:
+                continue
+            if file_path.name in indexed_names:
+                continue
+            file_hash = IngestManifest.hash_file(file_path)
+            if file_hash in indexed_files or file_hash in pending_files.values():
+                logging.info(f"Skipping duplicate of an indexed file: {file_path.name}")
+                continue
+            pending_files[str(file_path)] = file_hash
+        return pending_files
+
+    def get_pdf_parser(self):
+        """建立 PDFParser，解析結果會寫入共用的解析快取，相同內容的 PDF 只需解析一次。"""
+        return PDFParser(max_workers=self.chat_session_data.get("parse_workers"), cache=ParsedTextCache())
+
+    def load_documents(self, include_indexed=False):
+        """
+        加載 PDF 文件。
+
+        參數:
+            include_indexed (bool): 是否包含已寫入向量資料庫的文件；調整拆分方式重新建立索引時設為 True，
+                已解析過的文件會直接由解析快取讀取。
+        """
+        # 使用 PDFParser 以多行程依檔案與頁碼範圍平行解析 PDF 文件
+        parser = self.get_pdf_parser()
 
         # 加載 PDF 文件，並將其儲存在 documents 變數中
-        documents = loader.load()
+        if include_indexed:
+            documents = parser.parse_files(PDFParser.list_pdf_files(self.tmp_dir))
+        else:
+            pending_files = self.list_pending_files()
+            documents = parser.parse_files(list(pending_files), file_hashes=pending_files)
 
         # 如果沒有加載到任何文件，拋出異常提示
         if not documents:
@@ -66,198 +121,118 @@ class DocumentModel:
         # 返回已加載的文件
         return documents
 
-    def delete_temporary_files(self):
-        # 刪除臨時文件
-        for file in self.tmp_dir.iterdir():
+    def delete_temporary_files(self, file_paths=None):
+        # 刪除臨時文件，未指定 file_paths 時刪除暫存目錄中的所有文件
+        files = [Path(file_path) for file_path in file_paths] if file_paths is not None else self.tmp_dir.iterdir()
+        for file in files:
             try:
                 logging.info(f"Deleting temporary file: {file}")
                 file.unlink()
             except Exception as e:
                 logging.error(f"Error deleting file {file}: {e}")
 
+    def get_text_chunker(self):
+        """
+        依 chat_session_data 的 chunker_config 建立 TextChunker。
+
+        未設定時使用標題層級 1~2 加上 600/300 字元的拆分方式（與 split_documents_into_chunks_1 相同）。
+        """
+        chunker_config = {
+            'strategy': 'header',
+            'chunk_size': 600,
+            'chunk_overlap': 300,
+            'max_header_level': 2,
+            **(self.chat_session_data.get("chunker_config") or {})
+        }
+        return TextChunker(**chunker_config)
+
     def split_documents_into_chunks(self, documents):
-        # print(documents)
-        # 將文件拆分成塊
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=600,
-            chunk_overlap=300,
-            length_function=len
-        )
-        document_chunks = text_splitter.split_documents(documents)
-        # print("3. document_chunks: ", document_chunks)
-        logging.info(f"Split documents into {len(document_chunks)} chunks")
-        return document_chunks
+        # 將文件依字元數拆分成塊
+        text_splitter = TextChunker(strategy='size', chunk_size=600, chunk_overlap=300)
+        return text_splitter.split_documents(documents)
 
     def split_documents_into_chunks_1(self, documents):
         """
         將文件拆分為基於標題的結構和字元級內容小塊。
         """
-        # 引入所需模組
-        from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-        from langchain.docstore.document import Document
-        import logging
-
-        document_chunks = []  # 用於存儲拆分後的小塊
-        combined_markdown_content = ""  # 用於合併所有文檔內容
-
-        # 處理輸入文檔，將其合併為一個 Markdown 字串
-        for doc in documents:
-            if hasattr(doc, "page_content") and doc.page_content:
-                combined_markdown_content += str(doc.page_content)  # 合併有效內容
-            else:
-                logging.warning("跳過一個無內容的文檔。")  # 記錄無內容文檔的警告
-                continue
-
-        # 使用 MarkdownHeaderTextSplitter 進行基於標題的拆分
-        headers_to_split_on = [
-            ("#", "Header 1"),
-            ("##", "Header 2"),
-        ]
-
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-        md_header_splits = markdown_splitter.split_text(combined_markdown_content)  # 按標題拆分文檔
-
-        # 定義字元級拆分器
-        chunk_size = 600  # 每個塊的大小
-        chunk_overlap = 300  # 塊的重疊大小
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-        # 處理每個標題分組
-        for header_group in md_header_splits:
-            # 將每個標題組中的內容拆分為小塊
-            splits = text_splitter.split_text(header_group.page_content)
-            for split in splits:
-                document_chunks.append({
-                    "page_content": split,  # 小塊內容
-                    "metadata": header_group.metadata  # 對應的標題元數據
-                })
-
-        # 將拆分後的塊轉換為 LangChain Document 格式
-        transformed_documents = []
-        for i, chunk in enumerate(document_chunks):
-            transformed_documents.append(
-                Document(
-                    metadata={**chunk["metadata"], 'page': i},  # 新增頁碼到元數據
-                    page_content=chunk["page_content"] + "\n" + str(chunk["metadata"])  # 添加元數據信息
-                )
-            )
-
-        # 記錄拆分完成的日誌
-        logging.info(f"成功將文檔拆分為 {len(transformed_documents)} 個塊。")
-
-        return transformed_documents
+        text_splitter = TextChunker(strategy='header', chunk_size=600, chunk_overlap=300, max_header_level=2)
+        return text_splitter.split_documents(documents)
 
     def split_documents_into_chunks_3(self, documents):
         """
         將文件拆分為基於標題的結構小塊，並保留標題元數據。
         """
-        from langchain.text_splitter import MarkdownHeaderTextSplitter
-        from langchain.docstore.document import Document
-        import logging
-
-        # 初始化變數
-        document_chunks = []
-        markdown_document = ""
-
-        # 合併所有文檔內容為單一 Markdown 字串
-        for doc in documents:
-            if getattr(doc, "page_content", None):  # 確認文檔有內容
-                markdown_document += str(doc.page_content)
-            else:
-                logging.warning(f"Skipping a document with no content: {doc}")
-
-        # 如果文檔內容為空，直接返回空列表
-        if not markdown_document.strip():
-            logging.warning("No valid content found in the provided documents.")
-            return []
-
-        # 配置標題層級拆分器
-        headers_to_split_on = [
-            ("#", "Header 1"),
-            ("##", "Header 2"),
-            ("###", "Header 3"),
-            ("####", "Header 4"),
-        ]
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-        md_header_splits = markdown_splitter.split_text(markdown_document)
-
-        # 將拆分結果轉換為符合格式的文檔物件
-        for i, header_group in enumerate(md_header_splits):
-            document_chunks.append(
-                Document(
-                    metadata={**header_group.metadata, 'page': i},  # 包含元數據與頁碼
-                    page_content=str(header_group.metadata) + "\n" + header_group.page_content
-                )
-            )
-            print('1. header_group.page_content: ', type(header_group.page_content))
-            print('2-1. header_group.metadata: ', type(header_group.metadata))
-            print('2-2. header_group.metadata: ', header_group.metadata)
-
-        # 記錄成功處理的日誌
-        logging.info(f"Successfully split documents into {len(document_chunks)} chunks.")
-        return document_chunks
+        text_splitter = TextChunker(strategy='header', chunk_size=None, max_header_level=4)
+        return text_splitter.split_documents(documents)
 
     def split_documents_into_chunks_4(self, documents):
         """
         將文件拆分為基於標題的結構小塊，並保留標題元數據。
         """
-        from langchain.text_splitter import MarkdownHeaderTextSplitter
-        from langchain.docstore.document import Document
-        import logging
-
-        # 初始化變數
-        document_chunks = []
-        markdown_document = ""
-
-        # 合併所有文檔內容為單一 Markdown 字串
-        for doc in documents:
-            if getattr(doc, "page_content", None):  # 確認文檔有內容
-                markdown_document += str(doc.page_content)
-            else:
-                logging.warning(f"Skipping a document with no content: {doc}")
-
-        # 如果文檔內容為空，直接返回空列表
-        if not markdown_document.strip():
-            logging.warning("No valid content found in the provided documents.")
-            return []
-
-        # 配置標題層級拆分器
-        headers_to_split_on = [
-            ("#", "Header 1"),
-            ("##", "Header 2"),
-            ("###", "Header 3"),
-            ("####", "Header 4"),
-        ]
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-        md_header_splits = markdown_splitter.split_text(markdown_document)
-
-        # 將拆分結果轉換為符合格式的文檔物件
-        for i, header_group in enumerate(md_header_splits):
-            document_chunks.append(
-                Document(
-                    metadata={**header_group.metadata, 'page': i},  # 包含元數據與頁碼
-                    page_content=str(header_group.metadata) + "\n" + header_group.page_content
-                )
-            )
-            print('1. header_group.page_content: ', type(header_group.page_content))
-            print('2-1. header_group.metadata: ', type(header_group.metadata))
-            print('2-2. header_group.metadata: ', header_group.metadata)
-
-        # 記錄成功處理的日誌
-        logging.info(f"Successfully split documents into {len(document_chunks)} chunks.")
-        return document_chunks
+        return self.split_documents_into_chunks_3(documents)
 
-    def embeddings_on_local_vectordb(self, document_chunks):
-        # 將文檔塊嵌入本地向量數據庫，並返回檢索器設定
+    def get_embedding_function(self):
+        """
+        依 chat_session_data 的 mode 與 embedding 取得寫入用的 embedding 模型（已含共用的 embedding 快取）。
+        輸出維度沿用向量資料庫建立時的紀錄，新的向量資料庫在此決定並記錄維度。
+        """
         mode = self.chat_session_data.get("mode")
         embedding = self.chat_session_data.get("embedding")
-        embedding_function = EmbeddingAPI.get_embedding_function(mode, embedding)
+        dimensions = VectorStoreProfile(self.vector_store_dir).dimensions_for_ingest(embedding)
+        return EmbeddingAPI.get_embedding_function(mode, embedding, dimensions)
+
+    def open_local_vectordb(self, embedding_function=None):
+        """開啟（或建立）本地 Chroma 向量資料庫。"""
+        return Chroma(
+            embedding_function=embedding_function or self.get_embedding_function(),
+            persist_directory=self.vector_store_dir.as_posix()
+        )
+
+    def upsert_embedded_chunks(self, vector_db, document_chunks, vectors):
+        """
+        將已計算好向量的文檔塊寫入向量資料庫，寫入後即可被檢索。
+
+        文檔塊帶有 chunk_id（文件雜湊 + 序號）時以其作為 id，重複寫入不會產生重複向量；
+        同時寫入同目錄的 BM25 詞彙索引。
+        """
+        ids = [chunk.metadata.get('chunk_id') or str(uuid.uuid4()) for chunk in document_chunks]
+        vector_db._collection.upsert(
+            ids=ids,
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in document_chunks],
+            metadatas=[chunk.metadata or None for chunk in document_chunks]
+        )
+        self.get_lexical_index().add_documents(ids, document_chunks)
+        # 查詢端快取的向量資料庫需重新開啟才會看到新的文檔塊
+        get_vector_store_cache().invalidate(self.vector_store_dir)
+
+    def remove_file_chunks(self, vector_db, file_hashes):
+        """
+        刪除指定文件（以內容雜湊表示）已寫入向量資料庫與 BM25 詞彙索引的文檔塊。
+
+        重新處理同一文件時先清除舊的文檔塊，新的拆分結果較少時不會留下過時的 chunk_id。
+        """
+        file_hashes = list(file_hashes)
+        vector_db._collection.delete(where={'file_hash': {'$in': file_hashes}})
+        self.get_lexical_index().delete_files(file_hashes)
+
+    def get_lexical_index(self):
+        """取得與向量資料庫同目錄的 BM25 詞彙索引。"""
+        return LexicalIndex.for_vector_store(self.vector_store_dir)
+
+    def embeddings_on_local_vectordb(self, document_chunks):
+        # 將文檔塊嵌入本地向量數據庫，並返回檢索器設定
+        embedding_function = self.get_embedding_function()
         if not document_chunks:
             raise ValueError("No document chunks to embed. Please check the text splitting process.")
 
+        ids = [chunk.metadata.get('chunk_id') or str(uuid.uuid4()) for chunk in document_chunks]
         Chroma.from_documents(
             documents=document_chunks,
             embedding=embedding_function,
+            ids=ids,
             persist_directory=self.vector_store_dir.as_posix()
         )
+        self.get_lexical_index().add_documents(ids, document_chunks)
+        get_vector_store_cache().invalidate(self.vector_store_dir)
         logging.info(f"Persisted vector DB at {self.vector_store_dir}")
@@ -0,0 +1,77 @@
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(result_lists, rrf_k=60):
+    """
+    以 Reciprocal Rank Fusion 合併多個排序結果：每個文檔塊的分數為各列表中 1 / (rrf_k + 名次) 的總和。
+    """
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = doc.metadata.get('chunk_id') or doc.page_content
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    結合向量檢索與 BM25 詞彙檢索的檢索器。
+
+    一般問題以 RRF 合併兩邊的結果；問題本身就是一個精確詞彙（例如「麥寮廠」、憑證代號），
+    且詞彙索引中有文檔塊完整包含該詞彙時，直接返回詞彙檢索的結果，不必呼叫 embedding。
+    """
+
+    vector_retriever: BaseRetriever
+    lexical_index: Any
+    k: int = 3
+    lexical_k: int = 10
+    rrf_k: int = 60
+    exact_max_length: int = 12
+
+    @staticmethod
+    def _normalize(text):
+        return unicodedata.normalize('NFKC', text).lower()
+
+    def _exact_term(self, query):
+        """短且不含空白的問題視為精確詞彙，返回去除引號後的詞彙。"""
+        term = self._normalize(query).strip().strip('「」『』"\'?？。!！')
+        if term and len(term) <= self.exact_max_length and not any(ch.isspace() for ch in term):
+            return term
+        return None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical_docs = [doc for doc, _ in self.lexical_index.search(query, k=self.lexical_k)]
+
+        term = self._exact_term(query)
+        if term:
+            exact_docs = [doc for doc in lexical_docs if term in self._normalize(doc.page_content)]
+            if exact_docs:
+                return exact_docs[:self.k]
+
+        vector_docs = self.vector_retriever.invoke(query, config={'callbacks': run_manager.get_child()})
+        return reciprocal_rank_fusion([vector_docs, lexical_docs], self.rrf_k)[:self.k]
+
+
+class MultiStoreRetriever(BaseRetriever):
+    """
+    同時檢索多個向量資料庫（對話自己的資料庫與引用的共用知識庫），以 RRF 合併結果。
+
+    各資料庫的檢索器平行執行；同一文件同時存在於多個資料庫時，相同 chunk_id 的文檔塊只保留一份。
+    """
+
+    retrievers: List[BaseRetriever]
+    k: int = 3
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        config = {'callbacks': run_manager.get_child()}
+        with ThreadPoolExecutor(max_workers=len(self.retrievers)) as executor:
+            result_lists = list(executor.map(lambda retriever: retriever.invoke(query, config=config),
+                                             self.retrievers))
+        return reciprocal_rank_fusion(result_lists, self.rrf_k)[:self.k]
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+
+# 同一行程內對 manifest 檔案的讀寫鎖
+_manifest_lock = threading.Lock()
+
+
+class IngestManifest:
+    """
+    對話層級的文件處理紀錄 (ingest manifest)，以文件內容的 sha256 為鍵值。
+
+    記錄每個已寫入向量資料庫的文件，讓同一對話再次上傳時只處理新增的文件，
+    並避免重複的向量被寫入 Chroma。
+    """
+
+    def __init__(self, manifest_path):
+        """
+        參數:
+            manifest_path (Path): manifest JSON 檔案的路徑。
+        """
+        self.manifest_path = manifest_path
+
+    @staticmethod
+    def hash_bytes(content):
+        """計算文件內容的 sha256。"""
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def hash_file(file_path):
+        """以串流方式計算文件的 sha256。"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def load(self):
+        """讀取 manifest，檔案不存在時返回空紀錄。"""
+        if not self.manifest_path.exists():
+            return {'files': {}}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error reading ingest manifest {self.manifest_path}: {e}")
+            return {'files': {}}
+
+    def version(self):
+        """manifest 的修改時間（奈秒），每次寫入文件後改變；檔案不存在時為 None。"""
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _save(self, manifest):
+        """先寫入暫存檔再取代，避免寫入中斷造成 manifest 損毀。"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def indexed_files(self):
+        """返回 {file_hash: 紀錄} 的已處理文件字典。"""
+        return self.load().get('files', {})
+
+    def is_indexed(self, file_hash):
+        """檢查文件是否已寫入向量資料庫。"""
+        return file_hash in self.indexed_files()
+
+    def mark_indexed(self, file_hash, tmp_name, org_name, chunks):
+        """記錄文件已完成處理並寫入向量資料庫。"""
+        with _manifest_lock:
+            manifest = self.load()
+            manifest.setdefault('files', {})[file_hash] = {
+                'tmp_name': tmp_name,
+                'org_name': org_name,
+                'chunks': chunks,
+                'indexed_at': datetime.now().isoformat(timespec='seconds')
+            }
+            self._save(manifest)
+        logging.info(f"Marked {org_name} ({file_hash[:12]}) as indexed with {chunks} chunks")
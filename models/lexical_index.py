@@ -0,0 +1,168 @@
+import json
+import logging
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from langchain.schema import Document
+
+logging.basicConfig(level=logging.INFO)
+
+# 中日韓文字以字元 bigram 作為詞彙，英數字（代號、發票類別編號等）以整個詞作為詞彙
+TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+(?:[-_./][a-z0-9]+)*')
+CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+# 舊版 SQLite 單一查詢最多 999 個參數，IN (...) 的參數分批送出
+SQLITE_BATCH_SIZE = 500
+
+
+def tokenize(text):
+    """將文字切成 BM25 的詞彙：中文連續字元取 bigram（單一字元取 unigram），英數字取整個詞。"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize('NFKC', text).lower()):
+        run = match.group()
+        if CJK_PATTERN.match(run) and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    以 SQLite 存放的 BM25 倒排索引，與 Chroma 向量資料庫放在同一個目錄。
+
+    文件寫入向量資料庫時同步建立索引，文檔塊以 chunk_id 為鍵值，重複寫入時覆蓋舊的詞彙；
+    重新處理同一文件前以 delete_files 清除該文件原有的文檔塊。
+    內湖大樓、麥寮廠或發票類別代號這類精確詞彙，以詞彙比對比向量相似度更容易命中。
+    """
+
+    INDEX_FILE_NAME = 'lexical_index.db'
+
+    def __init__(self, index_path, k1=1.5, b=0.75):
+        """
+        參數:
+            index_path (Path): SQLite 檔案路徑。
+            k1 (float): BM25 的詞頻飽和參數。
+            b (float): BM25 的文件長度正規化參數。
+        """
+        self.index_path = Path(index_path)
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def for_vector_store(cls, vector_store_dir):
+        """取得向量資料庫目錄中的詞彙索引。"""
+        return cls(Path(vector_store_dir).joinpath(cls.INDEX_FILE_NAME))
+
+    def exists(self):
+        return self.index_path.exists()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _create_tables(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS docs (
+                chunk_id TEXT PRIMARY KEY,
+                length INTEGER,
+                page_content TEXT,
+                metadata TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT,
+                chunk_id TEXT,
+                tf INTEGER,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id)')
+
+    def add_documents(self, chunk_ids, documents):
+        """寫入（或覆蓋）文檔塊的詞彙。"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        doc_rows, posting_rows = [], []
+        for chunk_id, doc in zip(chunk_ids, documents):
+            counts = Counter(tokenize(doc.page_content))
+            doc_rows.append((chunk_id, sum(counts.values()), doc.page_content,
+                             json.dumps(doc.metadata or {}, ensure_ascii=False)))
+            posting_rows.extend((term, chunk_id, tf) for term, tf in counts.items())
+
+        with self._connect() as conn:
+            self._create_tables(conn)
+            conn.executemany('DELETE FROM postings WHERE chunk_id = ?', [(row[0],) for row in doc_rows])
+            conn.executemany(
+                'INSERT OR REPLACE INTO docs (chunk_id, length, page_content, metadata) VALUES (?, ?, ?, ?)',
+                doc_rows
+            )
+            conn.executemany('INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)', posting_rows)
+
+    def delete_files(self, file_hashes):
+        """
+        刪除指定文件（以內容雜湊表示）的所有文檔塊與詞彙。
+
+        重新寫入同一文件前呼叫，新的拆分結果文檔塊較少時，舊的 chunk_id 不會殘留在索引中。
+        """
+        if not self.exists():
+            return
+        with self._connect() as conn:
+            self._create_tables(conn)
+            for file_hash in file_hashes:
+                # chunk_id 為「雜湊-序號」，以範圍條件使用主鍵索引（'.' 是 '-' 的下一個字元）
+                bounds = (f"{file_hash}-", f"{file_hash}.")
+                conn.execute('DELETE FROM postings WHERE chunk_id >= ? AND chunk_id < ?', bounds)
+                conn.execute('DELETE FROM docs WHERE chunk_id >= ? AND chunk_id < ?', bounds)
+
+    @staticmethod
+    def _batched(items):
+        for start in range(0, len(items), SQLITE_BATCH_SIZE):
+            yield items[start:start + SQLITE_BATCH_SIZE]
+
+    def search(self, query, k=10):
+        """
+        以 BM25 搜尋，返回 [(Document, 分數)]，依分數由高到低排序。
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.exists():
+            return []
+
+        with self._connect() as conn:
+            self._create_tables(conn)
+            num_docs, avg_length = conn.execute('SELECT COUNT(*), AVG(length) FROM docs').fetchone()
+            if not num_docs:
+                return []
+
+            # 長的中文問題會產生大量 bigram，分批查詢
+            rows = []
+            for batch in self._batched(terms):
+                placeholders = ','.join('?' * len(batch))
+                rows.extend(conn.execute(
+                    f'SELECT p.term, p.chunk_id, p.tf, d.length FROM postings p '
+                    f'JOIN docs d ON d.chunk_id = p.chunk_id WHERE p.term IN ({placeholders})',
+                    batch
+                ).fetchall())
+
+            doc_freq = Counter(term for term, _, _, _ in rows)
+            scores = Counter()
+            for term, chunk_id, tf, length in rows:
+                idf = math.log(1 + (num_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+
+            top = scores.most_common(k)
+            if not top:
+                return []
+            docs = {}
+            for batch in self._batched([chunk_id for chunk_id, _ in top]):
+                placeholders = ','.join('?' * len(batch))
+                for chunk_id, page_content, metadata in conn.execute(
+                    f'SELECT chunk_id, page_content, metadata FROM docs WHERE chunk_id IN ({placeholders})',
+                    batch
+                ):
+                    docs[chunk_id] = Document(page_content=page_content, metadata=json.loads(metadata))
+        return [(docs[chunk_id], score) for chunk_id, score in top if chunk_id in docs]
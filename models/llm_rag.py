@@ -1,11 +1,11 @@
-import pandas as pd
-
 from apis.llm_api import LLMAPI
-from apis.embedding_api import EmbeddingAPI
 from apis.file_paths import FilePaths
-
-# from langchain_community.vectorstores import Chroma
-from langchain_chroma import Chroma
+from apis.batched_embeddings import embed_queries
+from models.vector_store_profile import get_store_embedding_function
+from models.rag_retriever import create_retriever, resolve_retrieval_config, shared_knowledge_bases
+from models.ingest_manifest import IngestManifest
+from models.semantic_cache import get_semantic_answer_cache, kb_fingerprint
+from models.retrieval_log import get_retrieval_log
 
 from langchain_core.runnables import RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -17,6 +17,7 @@ from langchain.chains.combine_documents import create_stuff_documents_chain
 
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 os.environ["CHROMA_TELEMETRY"] = "False"
 
 class RAGModel:
@@ -28,10 +29,13 @@ class RAGModel:
 
         # 初始化文件路徑
         file_paths = FilePaths()
-        self.output_dir = file_paths.get_output_dir()
         username = chat_session_data.get("username")
         conversation_id = chat_session_data.get("conversation_id")
         self.vector_store_dir = file_paths.get_local_vector_store_dir(username, conversation_id)
+        self.manifest = IngestManifest(file_paths.get_ingest_manifest_path(username, conversation_id))
+
+        # 檢索設定：MMR 實作、k、fetch_k、lambda_mult 與是否結合詞彙索引
+        self.retrieval_config = resolve_retrieval_config(chat_session_data, fetch_k=8)
 
     def query_llm_rag(self, query):
         """使用 RAG 查詢 LLM，根據給定的問題和檢索的文件內容返回答案。"""
@@ -40,14 +44,21 @@ class RAGModel:
             llm = LLMAPI.get_llm(self.mode, self.llm_option)
             # 初始化 embedding 模型
             embedding = self.chat_session_data.get("embedding")
-            embedding_function = EmbeddingAPI.get_embedding_function('內部LLM', embedding)
+            embedding_function = get_store_embedding_function(self.vector_store_dir, '內部LLM', embedding)
+
+            # 語意快取：知識庫未改變且問過相近的問題時，直接返回快取的答案與來源
+            use_semantic_cache = self._use_semantic_cache()
+            if use_semantic_cache:
+                fingerprint = self._kb_fingerprint(embedding)
+                query_vector = embedding_function.embed_query(query)
+                cached = get_semantic_answer_cache().lookup(self.vector_store_dir.as_posix(), fingerprint, query_vector)
+                if cached:
+                    response, retrieved_documents, _ = cached
+                    self._log_retrieved_data(query, retrieved_documents, response, cached=True)
+                    return response, retrieved_documents
 
-            # 建立向量資料庫和檢索器
-            vector_db = Chroma(
-                embedding_function=embedding_function,
-                persist_directory=self.vector_store_dir.as_posix()
-            )
-            retriever = vector_db.as_retriever(search_type="mmr",search_kwargs={"k": 3, "fetch_k": 8})
+            # 建立對話向量資料庫與共用知識庫的檢索器（同一個向量資料庫在行程內只開啟一次）
+            retriever = self._create_retriever(embedding_function)
 
             # 創建具備聊天記錄感知能力的檢索器
             history_aware_retriever = self._create_history_aware_retriever(llm, retriever)
@@ -65,8 +76,12 @@ class RAGModel:
             retrieved_documents = result_rag.get('context', [])  # 取得檢索到的文件
 
 
-            # 保存檢索到的數據到 CSV 文件
-            self._save_retrieved_data_to_csv(query, retrieved_documents, response)
+            if use_semantic_cache and response:
+                get_semantic_answer_cache().put(self.vector_store_dir.as_posix(), fingerprint, query, query_vector,
+                                                response, retrieved_documents)
+
+            # 記錄問題、檢索到的文件與回答（背景寫入，不阻塞查詢）
+            self._log_retrieved_data(query, retrieved_documents, response)
 
             return response, retrieved_documents
 
@@ -74,6 +89,107 @@ class RAGModel:
             # 當發生錯誤時顯示錯誤訊息
             return print(f"查詢 query_llm_rag 時發生錯誤: {e}"), []
 
+    def query_many(self, questions, concurrency=4):
+        """
+        批次回答多個彼此獨立的問題（離線評估用），結果順序與 questions 相同。
+
+        LLM、embedding 模型與檢索器只建立一次；所有問題先以一次批次請求嵌入並寫入查詢向量快取，
+        每個問題再對同一個已開啟的向量資料庫檢索，檢索與生成以最多 concurrency 個執行緒並行。
+
+        參數:
+            questions (list): 問題列表。
+            concurrency (int): 同時進行檢索與生成的問題數量。
+
+        返回:
+            list: 每個問題一個字典，包含 question、answer、documents、error（成功時為 None）、
+                semantic_cache_hit 與 retrieval_seconds、generation_seconds。
+        """
+        questions = list(questions)
+        llm = LLMAPI.get_llm(self.mode, self.llm_option)
+        embedding = self.chat_session_data.get("embedding")
+        embedding_function = get_store_embedding_function(self.vector_store_dir, '內部LLM', embedding)
+        retriever = self._create_retriever(embedding_function)
+        question_answer_chain = create_stuff_documents_chain(llm, self._create_qa_prompt())
+
+        # 每個 embedding 模型一次嵌入所有問題，檢索時的 embed_query 直接命中查詢向量快取
+        query_vectors = self._embed_questions(embedding_function, questions)
+        for kb in self._shared_kbs():
+            if kb.get_query_embedding_function() is not embedding_function:
+                self._embed_questions(kb.get_query_embedding_function(), questions)
+
+        # 批次問題一律不帶聊天記錄、也不經過問題改寫，與對話查詢分開存放，
+        # 不受對話的聊天記錄影響，也不會讓對話查詢讀到批次產生的答案
+        use_semantic_cache = self.chat_session_data.get('semantic_cache', True)
+        fingerprint = self._kb_fingerprint(embedding) if use_semantic_cache else None
+        scope = f"{self.vector_store_dir.as_posix()}#query_many"
+
+        def answer(index):
+            question, query_vector = questions[index], query_vectors[index]
+            result = {'question': question, 'answer': '', 'documents': [], 'error': None,
+                      'semantic_cache_hit': False, 'retrieval_seconds': 0.0, 'generation_seconds': 0.0}
+            try:
+                start_time = time.perf_counter()
+                cached = None
+                if use_semantic_cache and query_vector is not None:
+                    cached = get_semantic_answer_cache().lookup(scope, fingerprint, query_vector)
+                if cached:
+                    result.update(answer=cached[0], documents=cached[1], semantic_cache_hit=True,
+                                  retrieval_seconds=time.perf_counter() - start_time)
+                    self._log_retrieved_data(question, cached[1], cached[0], cached=True)
+                    return result
+
+                documents = retriever.invoke(question)
+                result['retrieval_seconds'] = time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                response = question_answer_chain.invoke({'input': question, 'chat_history': [], 'context': documents})
+                result['generation_seconds'] = time.perf_counter() - start_time
+                result.update(answer=response, documents=documents)
+
+                if use_semantic_cache and query_vector is not None and response:
+                    get_semantic_answer_cache().put(scope, fingerprint, question, query_vector, response, documents)
+                self._log_retrieved_data(question, documents, response)
+            except Exception as e:
+                print(f"查詢 query_many 第 {index + 1} 題時發生錯誤: {e}")
+                result['error'] = str(e)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='rag-query') as executor:
+            return list(executor.map(answer, range(len(questions))))
+
+    @staticmethod
+    def _embed_questions(embedding_function, questions):
+        """以問題的路徑（與 embed_query 相同）一次嵌入所有問題；失敗時返回 None 列表，由檢索時逐題嵌入。"""
+        try:
+            return embed_queries(embedding_function, questions)
+        except Exception as e:
+            print(f"批次嵌入問題時發生錯誤: {e}")
+            return [None] * len(questions)
+
+    def _use_semantic_cache(self):
+        """有聊天記錄時問題的意思依上下文而定（檢索前會依聊天記錄改寫問題），不使用語意快取。"""
+        return (self.chat_session_data.get('semantic_cache', True)
+                and not self.chat_session_data.get('chat_history'))
+
+    def _kb_fingerprint(self, embedding):
+        """知識庫指紋：已寫入的文件與影響答案的設定。"""
+        return kb_fingerprint(
+            self.manifest.indexed_files(),
+            embedding=embedding,
+            mode=self.mode,
+            llm_option=self.llm_option,
+            chunker_config=self.chat_session_data.get('chunker_config'),
+            retrieval_config=self.retrieval_config,
+            shared_kbs={kb.name: sorted(kb.manifest.indexed_files()) for kb in self._shared_kbs()}
+        )
+
+    def _shared_kbs(self):
+        return shared_knowledge_bases(self.chat_session_data)
+
+    def _create_retriever(self, embedding_function):
+        """建立對話向量資料庫與引用的共用知識庫的檢索器（見 models/rag_retriever.py）。"""
+        return create_retriever(self.vector_store_dir, embedding_function, self._shared_kbs(), self.retrieval_config)
+
     def _create_history_aware_retriever(self, llm, retriever):
         """創建具備聊天記錄感知能力的檢索器。"""
         contextualize_q_system_prompt = """
@@ -93,8 +209,8 @@ class RAGModel:
         # print('5. history_aware_retriever: ', history_aware_retriever)
         return history_aware_retriever
 
-    def _create_conversational_rag_chain(self, llm, history_aware_retriever):
-        """創建具聊天記錄功能的檢索增強生成鏈。"""
+    def _create_qa_prompt(self):
+        """創建依檢索到的內容回答問題的提示。"""
         # qa_system_prompt = """
         #     您是回答問題的助手。\
         #     使用以下檢索到的內容來回答問題。\
@@ -132,7 +248,7 @@ class RAGModel:
                     檢索到的內容: {context}
                 """
 
-        qa_prompt = ChatPromptTemplate.from_messages(
+        return ChatPromptTemplate.from_messages(
             [
                 ("system", qa_system_prompt),
                 MessagesPlaceholder("chat_history"),
@@ -140,8 +256,10 @@ class RAGModel:
             ]
         )
 
+    def _create_conversational_rag_chain(self, llm, history_aware_retriever):
+        """創建具聊天記錄功能的檢索增強生成鏈。"""
         # 創建一個問題回答鏈，並與檢索增強生成鏈結合
-        question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+        question_answer_chain = create_stuff_documents_chain(llm, self._create_qa_prompt())
         rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
 
         # 創建具聊天記錄功能的檢索增強生成鏈
@@ -164,24 +282,14 @@ class RAGModel:
             chat_history.add_ai_message(ai_response)
         return chat_history
 
-    def _save_retrieved_data_to_csv(self, query, retrieved_data, response):
-        """將檢索到的數據保存到 CSV 文件中。"""
-        # 確保輸出目錄存在，若不存在則創建
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        output_file = self.output_dir.joinpath('retrieved_data.csv')  # 定義輸出文件路徑
-
-        # 將檢索到的文件內容組合
-        context = "\n\n".join([f"文檔 {i + 1}:\n{chunk}" for i, chunk in enumerate(retrieved_data)])
-        new_data = {"Question": [query], "Context": [context], "Response": [response]}  # 新數據
-        new_df = pd.DataFrame(new_data)  # 將新數據轉換為 DataFrame
-
-        if output_file.exists():
-            # 如果文件已存在，讀取現有數據，並合併新數據
-            existing_df = pd.read_csv(output_file)
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        else:
-            # 如果文件不存在，僅使用新數據
-            combined_df = new_df
-
-        # 將合併後的數據保存到 CSV 文件
-        combined_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+    def _log_retrieved_data(self, query, retrieved_data, response, cached=False):
+        """將問題、檢索到的文件與回答加入只追加的檢索紀錄（data/output/retrieval_log）。"""
+        get_retrieval_log().append({
+            'username': self.chat_session_data.get('username'),
+            'conversation_id': self.chat_session_data.get('conversation_id'),
+            'question': query,
+            'context': "\n\n".join([f"文檔 {i + 1}:\n{doc.page_content}" for i, doc in enumerate(retrieved_data)]),
+            'sources': [doc.metadata for doc in retrieved_data],
+            'response': response,
+            'semantic_cache_hit': cached,
+        })
@@ -0,0 +1,83 @@
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# 檢索設定的預設值，可由 chat_session_data['retrieval_config'] 覆寫；
+# k、fetch_k 與 lambda_mult 沿用原本 as_retriever(search_type="mmr") 的設定，評估後再調整
+DEFAULT_RETRIEVAL_CONFIG = {
+    'mmr_impl': 'numpy',   # 'numpy'：本模組的向量化 MMR；'langchain'：Chroma 內建的 MMR
+    'k': 3,
+    'fetch_k': 8,
+    'lambda_mult': 0.5,
+    'hybrid': False,       # 是否結合 BM25 詞彙索引
+}
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k=3, lambda_mult=0.5):
+    """
+    以矩陣運算計算 MMR，返回選中的候選索引。
+
+    每一輪只需一次矩陣與向量的乘法更新「與已選結果的最大相似度」，
+    fetch_k 為數百時仍在毫秒內完成。
+
+    參數:
+        query_vector (array): 問題向量，形狀 (d,)。
+        candidate_vectors (array): 候選向量，形狀 (n, d)。
+        k (int): 選取數量。
+        lambda_mult (float): 相關性與多樣性的權衡，1 為只看相關性，0 為只看多樣性。
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if candidates.size == 0:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    selected = [int(np.argmax(relevance))]
+    max_similarity = candidates @ candidates[selected[0]]
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, candidates @ candidates[best], out=max_similarity)
+    return selected
+
+
+class NumpyMMRRetriever(BaseRetriever):
+    """
+    從 Chroma 一次取回 fetch_k 個候選（含向量），再以向量化的 MMR 選出 k 個結果。
+    """
+
+    vector_db: Any
+    embedding_function: Any
+    k: int = 3
+    fetch_k: int = 50
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = self.embedding_function.embed_query(query)
+        return self.search_by_vector(query_vector)
+
+    def search_by_vector(self, query_vector):
+        """以已計算好的問題向量檢索，批次查詢時可省去逐題嵌入。"""
+        result = self.vector_db._collection.query(
+            query_embeddings=[query_vector],
+            n_results=self.fetch_k,
+            include=['documents', 'metadatas', 'embeddings']
+        )
+        embeddings = result['embeddings'][0] if result.get('embeddings') is not None else []
+        if len(embeddings) == 0:
+            return []
+
+        selected = maximal_marginal_relevance(query_vector, embeddings, self.k, self.lambda_mult)
+        documents, metadatas = result['documents'][0], result['metadatas'][0]
+        # 與 Chroma 內建的 MMR 相同，選中的結果依與問題的相似度排序
+        return [Document(page_content=documents[i], metadata=metadatas[i] or {}) for i in sorted(selected)]
@@ -0,0 +1,67 @@
+import gzip
+import json
+import logging
+import os
+import uuid
+from apis.file_paths import FilePaths
+
+logging.basicConfig(level=logging.INFO)
+
+
+class ParsedTextCache:
+    """
+    PDF 解析結果的持久化快取，以文件內容的 sha256 為鍵值。
+
+    每個 PDF 的逐頁文字與頁碼以 gzip 壓縮的 JSON Lines 存放於 data/cache/parsed_text/，
+    調整拆分參數或重新建立索引時可直接讀取，不必重新解析 PDF。
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        參數:
+            cache_dir (Path, optional): 快取目錄，預設為 data/cache/parsed_text。
+        """
+        self.cache_dir = cache_dir or FilePaths().get_cache_dir().joinpath('parsed_text')
+
+    def _path(self, file_hash):
+        return self.cache_dir.joinpath(file_hash[:2], f"{file_hash}.jsonl.gz")
+
+    def contains(self, file_hash):
+        """檢查文件是否已有解析快取。"""
+        return self._path(file_hash).exists()
+
+    def iter_pages(self, file_hash):
+        """逐頁讀取快取，產生 (頁碼, 文字)。"""
+        with gzip.open(self._path(file_hash), 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                yield record['page'], record['text']
+
+    def writer(self, file_hash):
+        """建立逐頁寫入快取的 writer，commit 後快取才會生效。"""
+        return _ParsedTextWriter(self._path(file_hash))
+
+
+class _ParsedTextWriter:
+    """逐頁寫入暫存檔，全部頁面寫完後再以 rename 讓快取生效，避免留下不完整的快取。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        self.file = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+
+    def add(self, page, text):
+        self.file.write(json.dumps({'page': page, 'text': text}, ensure_ascii=False) + '\n')
+
+    def commit(self):
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+        logging.info(f"Saved parsed text cache {self.path.name}")
+
+    def abort(self):
+        self.file.close()
+        try:
+            self.tmp_path.unlink()
+        except OSError:
+            pass
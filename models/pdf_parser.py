@@ -0,0 +1,169 @@
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from pypdf import PdfReader
+from langchain.schema import Document
+from models.ingest_manifest import IngestManifest
+
+# 設定日誌記錄的級別為 INFO
+logging.basicConfig(level=logging.INFO)
+
+
+def _parse_page_range(file_path, start_page, end_page):
+    """
+    子行程工作函式：解析單一 PDF 的指定頁碼範圍 [start_page, end_page)。
+
+    只回傳可序列化的 (頁碼, 文字) 清單，避免在行程間傳遞 Document 物件。
+    """
+    reader = PdfReader(file_path)
+    return [(page_number, reader.pages[page_number].extract_text())
+            for page_number in range(start_page, end_page)]
+
+
+class PDFParser:
+    """
+    多行程 PDF 解析引擎，依「檔案 + 頁碼範圍」切分工作並分散到行程池。
+
+    回傳結果與 PyPDFDirectoryLoader 相同：每頁一個 Document，
+    metadata 包含 source 與 page，並依 (檔名, 頁碼) 保持穩定順序。
+    """
+
+    def __init__(self, max_workers=None, pages_per_task=20, cache=None):
+        """
+        參數:
+            max_workers (int, optional): 行程池的工作數量，預設為 CPU 核心數。
+            pages_per_task (int): 每個工作負責解析的頁數。
+            cache (ParsedTextCache, optional): 解析結果快取，未提供時每次都重新解析。
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = max(1, pages_per_task)
+        self.cache = cache
+
+    @staticmethod
+    def list_pdf_files(directory, glob='**/*.pdf'):
+        """列出目錄下所有符合 glob 的 PDF 文件，依路徑排序。"""
+        return sorted(p for p in Path(directory).glob(glob)
+                      if p.is_file() and not p.name.startswith('.'))
+
+    def parse_directory(self, directory, glob='**/*.pdf'):
+        """解析目錄下所有符合 glob 的 PDF 文件。"""
+        return self.parse_files(self.list_pdf_files(directory, glob))
+
+    def parse_files(self, file_paths, file_hashes=None):
+        """解析指定的 PDF 文件清單，並返回依序排列的 Document 列表。"""
+        documents = list(self.iter_parse(file_paths, file_hashes))
+        logging.info(f"Parsed {len(documents)} pages from {len(file_paths)} files")
+        return documents
+
+    def iter_parse(self, file_paths, file_hashes=None):
+        """
+        逐頁產生 Document 的生成器，順序與 parse_files 相同。
+
+        行程池中同時進行的工作數量以 max_workers 的兩倍為上限，
+        消費端處理較慢時不會累積大量已解析但尚未取用的頁面。
+        設定 cache 時，已解析過的文件直接由快取讀取，新解析的文件會寫入快取。
+
+        參數:
+            file_paths (list): PDF 文件路徑。
+            file_hashes (dict, optional): {檔案路徑: 內容雜湊}，未提供時由 PDFParser 自行計算。
+        """
+        tasks = self._build_tasks(file_paths, file_hashes or {})
+        if not tasks:
+            return
+
+        writers = {}
+        try:
+            # 工作量很小時直接在目前行程解析，省下建立行程池的成本
+            parse_tasks = [task for task in tasks if task[1] is not None]
+            if self.max_workers == 1 or len(parse_tasks) <= 1:
+                for task in tasks:
+                    pages = None if task[1] is None else _parse_page_range(*task[:3])
+                    yield from self._emit(task, pages, writers)
+                return
+
+            workers = min(self.max_workers, len(parse_tasks))
+            # 呼叫端（Streamlit、ingest pipeline）為多執行緒行程，fork 可能複製到其他執行緒持有的鎖而死結，改用 spawn
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                pending = deque()
+                task_iter = iter(tasks)
+                in_flight = 0
+
+                # 依提交順序取回結果，確保輸出順序穩定
+                while True:
+                    while in_flight < workers * 2:
+                        task = next(task_iter, None)
+                        if task is None:
+                            break
+                        future = None if task[1] is None else executor.submit(_parse_page_range, *task[:3])
+                        in_flight += future is not None
+                        pending.append((task, future))
+                    if not pending:
+                        break
+
+                    task, future = pending.popleft()
+                    pages = None
+                    if future is not None:
+                        pages = future.result()
+                        in_flight -= 1
+                    yield from self._emit(task, pages, writers)
+        finally:
+            # 未完整解析的文件不寫入快取
+            for writer in writers.values():
+                writer.abort()
+
+    def _emit(self, task, pages, writers):
+        """產生單一工作的 Document；快取命中時由快取讀取，否則寫入快取。"""
+        file_path, start_page, _, file_hash, is_last = task
+        if start_page is None:
+            yield from self._to_documents(file_path, self.cache.iter_pages(file_hash))
+            return
+
+        if self.cache is not None:
+            writer = writers.get(file_hash)
+            if writer is None:
+                writer = writers[file_hash] = self.cache.writer(file_hash)
+            for page_number, text in pages:
+                writer.add(page_number, text)
+            if is_last:
+                writers.pop(file_hash).commit()
+
+        yield from self._to_documents(file_path, pages)
+
+    @staticmethod
+    def _to_documents(file_path, pages):
+        """將 (頁碼, 文字) 清單轉換為 LangChain Document。"""
+        for page_number, text in pages:
+            yield Document(
+                page_content=text,
+                metadata={'source': file_path, 'page': page_number}
+            )
+
+    def _build_tasks(self, file_paths, file_hashes):
+        """
+        依頁數將每個文件切分為 (檔案路徑, 起始頁, 結束頁, 內容雜湊, 是否為最後一段) 的工作清單。
+
+        已有解析快取的文件只產生一個起始頁為 None 的工作，不需開啟 PDF。
+        """
+        tasks = []
+        for file_path in file_paths:
+            file_path = str(file_path)
+            file_hash = None
+            if self.cache is not None:
+                file_hash = file_hashes.get(file_path) or IngestManifest.hash_file(file_path)
+                if self.cache.contains(file_hash):
+                    tasks.append((file_path, None, None, file_hash, True))
+                    continue
+
+            try:
+                num_pages = len(PdfReader(file_path).pages)
+            except Exception as e:
+                logging.error(f"Error reading PDF {file_path}: {e}")
+                continue
+
+            for start_page in range(0, num_pages, self.pages_per_task):
+                end_page = min(start_page + self.pages_per_task, num_pages)
+                tasks.append((file_path, start_page, end_page, file_hash, end_page == num_pages))
+        return tasks
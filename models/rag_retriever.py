@@ -0,0 +1,65 @@
+from models.hybrid_retriever import HybridRetriever, MultiStoreRetriever
+from models.lexical_index import LexicalIndex
+from models.mmr import NumpyMMRRetriever, DEFAULT_RETRIEVAL_CONFIG
+from models.shared_kb import SharedKnowledgeBase
+from models.vector_store_cache import get_vector_store_cache
+
+
+def resolve_retrieval_config(chat_session_data, **defaults):
+    """
+    合併檢索設定：DEFAULT_RETRIEVAL_CONFIG、呼叫端的預設值（例如各 RAG 模型原本的 fetch_k），
+    最後以 chat_session_data['retrieval_config'] 覆寫。
+    """
+    return {**DEFAULT_RETRIEVAL_CONFIG, **defaults, **(chat_session_data.get('retrieval_config') or {})}
+
+
+def shared_knowledge_bases(chat_session_data):
+    """對話引用的共用知識庫（chat_session_data['shared_kbs']），略過尚未建立的名稱。"""
+    kbs = [SharedKnowledgeBase(name) for name in chat_session_data.get('shared_kbs') or []]
+    return [kb for kb in kbs if kb.exists()]
+
+
+def create_retriever(vector_store_dir, embedding_function, shared_kbs, config):
+    """
+    建立對話向量資料庫與引用的共用知識庫的檢索器，檢索多個資料庫時以 RRF 合併結果。
+    共用知識庫以建立時的 embedding 模型嵌入問題；共用知識庫由其他行程（CLI）寫入，
+    以其 manifest 的修改時間作為版本，重新建立後查詢端會重新開啟向量資料庫。
+    """
+    stores = []
+    # 對話尚未上傳文件時只檢索共用知識庫
+    if vector_store_dir.exists() or not shared_kbs:
+        stores.append((vector_store_dir, embedding_function, None))
+    stores.extend((kb.vector_store_dir, kb.get_query_embedding_function(), kb.manifest.version()) for kb in shared_kbs)
+
+    retrievers = [create_store_retriever(store_dir, store_embedding, config, version)
+                  for store_dir, store_embedding, version in stores]
+    if len(retrievers) == 1:
+        return retrievers[0]
+    return MultiStoreRetriever(retrievers=retrievers, k=config['k'])
+
+
+def create_store_retriever(vector_store_dir, embedding_function, config, version=None):
+    """依檢索設定建立單一向量資料庫的 MMR 檢索器，並視設定結合 BM25 詞彙索引。"""
+    vector_db = get_vector_store_cache().get(vector_store_dir, embedding_function, version)
+    if config['mmr_impl'] == 'numpy':
+        vector_retriever = NumpyMMRRetriever(
+            vector_db=vector_db,
+            embedding_function=embedding_function,
+            k=config['k'],
+            fetch_k=config['fetch_k'],
+            lambda_mult=config['lambda_mult']
+        )
+    else:
+        vector_retriever = vector_db.as_retriever(
+            search_type="mmr",
+            search_kwargs={"k": config['k'], "fetch_k": config['fetch_k'], "lambda_mult": config['lambda_mult']}
+        )
+
+    if not config['hybrid']:
+        return vector_retriever
+    # 結合 BM25 詞彙索引，精確詞彙的問題直接由詞彙索引回答
+    return HybridRetriever(
+        vector_retriever=vector_retriever,
+        lexical_index=LexicalIndex.for_vector_store(vector_store_dir),
+        k=config['k']
+    )
@@ -0,0 +1,137 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from apis.file_paths import FilePaths
+
+logging.basicConfig(level=logging.INFO)
+
+# 寫入執行緒的結束訊號
+_STOP = object()
+
+
+class RetrievalLog:
+    """
+    RAG 檢索紀錄：以 JSONL 分段檔案只追加寫入，取代每次查詢都讀取並重寫整個 CSV。
+
+    查詢端只將紀錄放入佇列，由背景執行緒批次寫入；檔案超過 max_segment_bytes 時換到新的分段。
+    分段檔名包含行程 ID，多個行程同時寫入時不會寫到同一個檔案。
+    """
+
+    def __init__(self, log_dir=None, max_segment_bytes=None, queue_size=10000):
+        """
+        參數:
+            log_dir (Path, optional): 紀錄目錄，預設為 data/output/retrieval_log。
+            max_segment_bytes (int, optional): 每個分段的大小上限，預設讀取環境變數 RETRIEVAL_LOG_SEGMENT_BYTES（預設 16 MiB）。
+            queue_size (int): 等待寫入的紀錄上限，佇列已滿時捨棄新紀錄，不阻塞查詢。
+        """
+        self.log_dir = log_dir or FilePaths().get_output_dir().joinpath('retrieval_log')
+        self.max_segment_bytes = max_segment_bytes or int(os.getenv("RETRIEVAL_LOG_SEGMENT_BYTES", str(16 * 1024 ** 2)))
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_seq = 0
+        self.dropped = 0
+
+    def append(self, record):
+        """加入一筆紀錄，由背景執行緒寫入。"""
+        self._ensure_writer()
+        record = {'time': datetime.now().isoformat(timespec='milliseconds'), **record}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            logging.warning("Retrieval log queue is full, dropping record")
+
+    def flush(self):
+        """等待佇列中的紀錄全部寫入。"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """寫完佇列中的紀錄後停止背景執行緒。"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='retrieval-log', daemon=True)
+                self._thread.start()
+
+    def _next_segment(self):
+        self._segment_seq += 1
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._segment_seq:04d}.jsonl"
+        return self.log_dir.joinpath(name)
+
+    def _run(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            records = [self._queue.get()]
+            # 一次取出佇列中所有紀錄，合併成一次寫入
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in records
+            records = [record for record in records if record is not _STOP]
+            try:
+                if records:
+                    self._write(records)
+            except Exception as e:
+                logging.error(f"Error writing retrieval log: {e}")
+            finally:
+                for _ in range(len(records) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        if self._segment is None or (self._segment.exists() and self._segment.stat().st_size >= self.max_segment_bytes):
+            self._segment = self._next_segment()
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+        with open(self._segment, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def segments(self):
+        """依時間順序列出分段檔案。"""
+        if not self.log_dir.exists():
+            return []
+        return sorted(self.log_dir.glob('*.jsonl'))
+
+    def load_dataframe(self):
+        """將所有分段讀入 DataFrame 以便分析，略過寫入中斷造成的不完整行。"""
+        rows = []
+        for segment in self.segments():
+            with open(segment, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logging.warning(f"Skipping malformed line in {segment.name}")
+        return pd.DataFrame(rows)
+
+
+_shared_log = None
+_shared_log_lock = threading.Lock()
+
+
+def get_retrieval_log():
+    """取得行程內共用的 RetrievalLog 實例，行程結束前寫完佇列中的紀錄。"""
+    global _shared_log
+    with _shared_log_lock:
+        if _shared_log is None:
+            _shared_log = RetrievalLog()
+            atexit.register(_shared_log.close)
+        return _shared_log
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain.schema import Document
+from apis.file_paths import FilePaths
+
+logging.basicConfig(level=logging.INFO)
+
+
+def kb_fingerprint(indexed_files, **settings):
+    """
+    計算知識庫的指紋：已寫入的文件雜湊與檢索、生成相關的設定（embedding、拆分方式、模型等），
+    任何一項改變時指紋就不同，舊的快取答案不會再被使用。
+    """
+    payload = {
+        'files': sorted(indexed_files),
+        'settings': settings,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    RAG 答案的語意快取。
+
+    以 (知識庫範圍, 知識庫指紋) 分組存放問題向量與答案，新問題與既有問題的 cosine 相似度
+    達到 threshold 時直接返回快取的答案與來源，不必重新檢索與生成。
+    答案超過 ttl_seconds 後失效；同一範圍的知識庫指紋改變（新增文件、更換模型或設定）時，舊答案一併清除。
+    """
+
+    def __init__(self, db_path=None, threshold=None, ttl_seconds=None):
+        """
+        參數:
+            db_path (Path, optional): SQLite 檔案路徑，預設為 data/cache/semantic_answer_cache.db。
+            threshold (float, optional): 命中所需的最低 cosine 相似度，預設讀取環境變數 SEMANTIC_CACHE_THRESHOLD（預設 0.95）。
+            ttl_seconds (int, optional): 答案的有效秒數，預設讀取環境變數 SEMANTIC_CACHE_TTL（預設 86400）。
+        """
+        self.db_path = db_path or FilePaths().get_cache_dir().joinpath('semantic_answer_cache.db')
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+        self.ttl_seconds = ttl_seconds or int(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS answers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    scope TEXT,
+                    fingerprint TEXT,
+                    query TEXT,
+                    vector BLOB,
+                    answer TEXT,
+                    sources TEXT,
+                    created_at REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_answers_scope ON answers (scope, fingerprint)')
+
+    def _purge(self, conn, scope, fingerprint):
+        """刪除過期的答案，以及同一範圍內指紋已改變的答案。"""
+        conn.execute('DELETE FROM answers WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        conn.execute('DELETE FROM answers WHERE scope = ? AND fingerprint != ?', (scope, fingerprint))
+
+    def lookup(self, scope, fingerprint, query_vector):
+        """
+        查詢語意相近的快取答案。
+
+        返回:
+            tuple: (答案, 來源文件列表, 相似度)，未命中時返回 None。
+        """
+        with self._connect() as conn:
+            self._purge(conn, scope, fingerprint)
+            rows = conn.execute(
+                'SELECT vector, answer, sources FROM answers WHERE scope = ? AND fingerprint = ?',
+                (scope, fingerprint)
+            ).fetchall()
+        if not rows:
+            return None
+
+        matrix = np.stack([np.frombuffer(vector, dtype=np.float32) for vector, _, _ in rows])
+        query = np.asarray(query_vector, dtype=np.float32)
+        if matrix.shape[1] != query.shape[0]:
+            return None
+        similarities = (matrix @ query) / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+
+        _, answer, sources = rows[best]
+        documents = [Document(page_content=s['page_content'], metadata=s['metadata']) for s in json.loads(sources)]
+        logging.info(f"Semantic cache hit (similarity {similarities[best]:.3f})")
+        return answer, documents, float(similarities[best])
+
+    def put(self, scope, fingerprint, query, query_vector, answer, documents):
+        """存入新的答案與來源文件。"""
+        sources = json.dumps(
+            [{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in documents],
+            ensure_ascii=False, default=str
+        )
+        with self._connect() as conn:
+            self._purge(conn, scope, fingerprint)
+            conn.execute(
+                'INSERT INTO answers (scope, fingerprint, query, vector, answer, sources, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (scope, fingerprint, query, np.asarray(query_vector, dtype=np.float32).tobytes(),
+                 answer, sources, time.time())
+            )
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_semantic_answer_cache():
+    """取得行程內共用的 SemanticAnswerCache 實例。"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SemanticAnswerCache()
+        return _shared_cache
@@ -0,0 +1,137 @@
+import argparse
+import json
+import logging
+from pathlib import Path
+from apis.file_paths import FilePaths
+from models.document_model import DocumentModel
+from models.ingest_manifest import IngestManifest
+from models.vector_store_profile import get_store_embedding_function
+from services.ingest_pipeline import IngestPipeline
+
+logging.basicConfig(level=logging.INFO)
+
+
+class SharedKnowledgeBase(DocumentModel):
+    """
+    公司共用的知識庫，存放於 data/shared_kb/<名稱>/，任何對話都可以名稱引用。
+
+    規章、出差辦法這類共用文件只需解析、嵌入並寫入一次，不必在每個對話的向量資料庫各存一份；
+    個人上傳的文件仍寫入對話自己的向量資料庫，查詢時兩者一起檢索。
+    知識庫使用的 embedding 模型記錄在 kb_config.json，查詢端以相同模型嵌入問題。
+    """
+
+    CONFIG_FILE_NAME = 'kb_config.json'
+    DEFAULT_CONFIG = {'mode': '內部LLM', 'embedding': 'bge-m3', 'chunker_config': None}
+
+    def __init__(self, name, mode=None, embedding=None, chunker_config=None):
+        """
+        參數:
+            name (str): 知識庫名稱，即 data/shared_kb 下的目錄名稱。
+            mode (str, optional): embedding 模型的來源（內部LLM / 外部LLM），未提供時沿用 kb_config.json。
+            embedding (str, optional): embedding 模型名稱，未提供時沿用 kb_config.json。
+            chunker_config (dict, optional): 拆分方式，未提供時沿用 kb_config.json。
+        """
+        self.name = name
+        self.file_paths = FilePaths()
+        self.kb_dir = self.file_paths.get_shared_kb_dir(name)
+        self.config_path = self.kb_dir.joinpath(self.CONFIG_FILE_NAME)
+        config = {**self.DEFAULT_CONFIG, **self.load_config()}
+        # DocumentModel 的拆分、嵌入與寫入方法都讀取 chat_session_data
+        self.chat_session_data = {
+            'mode': mode or config['mode'],
+            'embedding': embedding or config['embedding'],
+            'chunker_config': chunker_config or config['chunker_config'],
+        }
+        self.tmp_dir = self.kb_dir.joinpath('documents')
+        self.vector_store_dir = self.kb_dir.joinpath('vector_store')
+        self.manifest = IngestManifest(self.kb_dir.joinpath('ingest_manifest.json'))
+
+    @staticmethod
+    def list_names():
+        """列出已建立的共用知識庫名稱。"""
+        root = FilePaths().get_shared_kb_root()
+        if not root.exists():
+            return []
+        return sorted(path.name for path in root.iterdir()
+                      if path.joinpath(SharedKnowledgeBase.CONFIG_FILE_NAME).exists())
+
+    def exists(self):
+        return self.config_path.exists()
+
+    def load_config(self):
+        """讀取 kb_config.json，檔案不存在時返回空設定。"""
+        if not self.config_path.exists():
+            return {}
+        with open(self.config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_config(self):
+        self.kb_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.config_path, 'w', encoding='utf-8') as f:
+            json.dump(self.chat_session_data, f, ensure_ascii=False, indent=2)
+
+    def get_query_embedding_function(self):
+        """取得查詢用的 embedding 模型，輸出維度與知識庫建立時相同。"""
+        return get_store_embedding_function(self.vector_store_dir, self.chat_session_data['mode'],
+                                            self.chat_session_data['embedding'])
+
+    def _check_config(self):
+        """已寫入的向量與目前的 embedding 模型或拆分方式不同時，不允許繼續寫入。"""
+        config = self.load_config()
+        for key, value in self.chat_session_data.items():
+            if key in config and config[key] != value:
+                raise ValueError(f"Shared KB '{self.name}' was built with {key}={config[key]!r}, got {value!r}")
+
+    def add_files(self, pdf_paths, cancel_event=None, progress_callback=None):
+        """
+        將 PDF 文件寫入共用知識庫，已寫入過的相同內容文件會被略過。
+
+        返回:
+            dict: 管線各階段的處理數量，沒有新文件時為空字典。
+        """
+        self._check_config()
+        source_docs = [{'name': Path(path).name, 'content': Path(path).read_bytes()} for path in pdf_paths]
+        doc_names = self.create_temporary_files(source_docs)
+        pending_files = self.list_pending_files()
+        if not pending_files:
+            logging.info(f"No new files for shared KB '{self.name}'")
+            self._save_config()
+            return {}
+
+        pipeline = IngestPipeline(self, cancel_event=cancel_event, progress_callback=progress_callback)
+        stats = pipeline.run(list(pending_files), file_hashes=pending_files)
+        for file_path, file_hash in pending_files.items():
+            tmp_name = Path(file_path).name
+            self.manifest.mark_indexed(
+                file_hash, tmp_name, doc_names.get(tmp_name, tmp_name),
+                pipeline.file_chunks.get(file_hash, 0)
+            )
+        self._save_config()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共用知識庫管理")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="建立共用知識庫或加入新文件")
+    build_parser.add_argument("name", help="知識庫名稱")
+    build_parser.add_argument("pdfs", nargs='+', help="PDF 文件路徑")
+    build_parser.add_argument("--mode", default=None, help="embedding 模型來源，預設沿用既有設定或 內部LLM")
+    build_parser.add_argument("--embedding", default=None, help="embedding 模型名稱，預設沿用既有設定或 bge-m3")
+
+    subparsers.add_parser('list', help="列出共用知識庫")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        kb = SharedKnowledgeBase(args.name, mode=args.mode, embedding=args.embedding)
+        stats = kb.add_files(args.pdfs)
+        print(f"{args.name}: {len(kb.manifest.indexed_files())} files indexed, {stats}")
+    else:
+        for name in SharedKnowledgeBase.list_names():
+            kb = SharedKnowledgeBase(name)
+            print(f"{name}\t{kb.chat_session_data['embedding']}\t{len(kb.manifest.indexed_files())} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import bisect
+import logging
+import re
+from langchain.schema import Document
+
+logging.basicConfig(level=logging.INFO)
+
+# 依優先順序嘗試的斷句分隔符號
+DEFAULT_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", ". ", " "]
+
+# Markdown 標題行，例如 "## 第二章 出差旅費"
+HEADER_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+
+class TextChunker:
+    """
+    線性時間的文件拆分引擎，支援「標題層級」與「字元數」兩種策略。
+
+    逐頁讀取文件一次，緩衝區大小維持在數個 chunk_size 以內，
+    並記錄每個文檔塊在原文件中的字元位置 (start_index) 與頁碼 (page)。
+    """
+
+    def __init__(self, strategy='header', chunk_size=600, chunk_overlap=300,
+                 max_header_level=2, include_headers_in_content=True, separators=None):
+        """
+        參數:
+            strategy (str): 'header' 依 Markdown 標題分段後再依字元數拆分；'size' 只依字元數拆分。
+            chunk_size (int, optional): 每個塊的最大字元數；為 None 時每個標題段落為一個塊。
+            chunk_overlap (int): 相鄰塊的重疊字元數。
+            max_header_level (int): 作為分段依據的最大標題層級（1 代表只看 "#"）。
+            include_headers_in_content (bool): 是否在塊內容前加上所屬標題路徑。
+            separators (list, optional): 斷句分隔符號，預設為 DEFAULT_SEPARATORS。
+        """
+        if strategy not in ('header', 'size'):
+            raise ValueError(f"無效的拆分策略：{strategy}")
+        if chunk_size is None and strategy == 'size':
+            raise ValueError("字元數拆分策略必須指定 chunk_size")
+        if chunk_size is not None and chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap 必須小於 chunk_size")
+
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_header_level = max_header_level
+        self.include_headers_in_content = include_headers_in_content
+        self.separators = separators or DEFAULT_SEPARATORS
+
+    def split_documents(self, documents):
+        """拆分文件並返回 Document 列表。"""
+        document_chunks = list(self.iter_chunks(documents))
+        logging.info(f"Split documents into {len(document_chunks)} chunks")
+        return document_chunks
+
+    def iter_chunks(self, documents):
+        """逐一產生拆分後的 Document，適合串流處理。"""
+        state = _ChunkState()
+        for doc in documents:
+            text = getattr(doc, "page_content", None)
+            if not text:
+                logging.warning(f"Skipping a document with no content: {getattr(doc, 'metadata', {})}")
+                continue
+
+            metadata = doc.metadata or {}
+            source = metadata.get('source')
+            if source != state.source:
+                # 換到另一個來源文件時，結束目前段落並重設標題
+                yield from self._flush(state, final=True)
+                state.reset(source)
+
+            # 頁面之間補上換行，避免前一頁最後一行與下一頁第一行黏在一起
+            if not text.endswith('\n'):
+                text += '\n'
+            state.mark_page(metadata.get('page'))
+            if self.strategy == 'header':
+                yield from self._feed_lines(state, text)
+            else:
+                state.append(text)
+                yield from self._flush(state, final=False)
+
+        yield from self._flush(state, final=True)
+
+    def _feed_lines(self, state, text):
+        """依行讀取頁面內容，遇到標題行時結束目前段落。"""
+        for line in text.splitlines(keepends=True):
+            match = HEADER_PATTERN.match(line)
+            if match and len(match.group(1)) <= self.max_header_level:
+                yield from self._flush(state, final=True)
+                state.set_header(len(match.group(1)), match.group(2))
+                state.skip(len(line))  # 標題行不放入內容，但仍計入字元位置
+            else:
+                state.append(line)
+        yield from self._flush(state, final=False)
+
+    def _flush(self, state, final):
+        """
+        將緩衝區中的內容拆分為塊。
+
+        final 為 False 時只處理距離緩衝區結尾超過兩個 chunk_size 的部分，
+        保留尾端內容與下一頁合併，確保跨頁內容能被完整拆分。
+        """
+        if not state.buffer:
+            return
+        if self.chunk_size is None:
+            if not final:
+                return
+            text = ''.join(state.buffer)
+            if text.strip():
+                yield self._make_chunk(state, text, 0)
+            state.consume(text, len(text))
+            return
+
+        text = ''.join(state.buffer)
+        pos = 0
+        while pos < len(text):
+            remaining = len(text) - pos
+            if not final and remaining < self.chunk_size * 2:
+                break
+
+            end = self._find_end(text, pos)
+            if text[pos:end].strip():
+                yield self._make_chunk(state, text[pos:end], pos)
+            if end >= len(text):
+                pos = end
+                break
+            pos = self._find_next_start(text, pos, end)
+
+        state.consume(text, pos)
+
+    def _find_end(self, text, start):
+        """在 chunk_size 範圍內尋找最後一個分隔符號作為塊的結尾。"""
+        limit = start + self.chunk_size
+        if limit >= len(text):
+            return len(text)
+        min_end = start + self.chunk_size // 2
+        for separator in self.separators:
+            idx = text.rfind(separator, min_end, limit)
+            if idx != -1:
+                return idx + len(separator)
+        return limit
+
+    def _find_next_start(self, text, start, end):
+        """依重疊字元數決定下一個塊的起點，並盡量對齊到分隔符號之後。"""
+        next_start = max(end - self.chunk_overlap, start + 1)
+        for separator in self.separators:
+            idx = text.find(separator, next_start, end)
+            if idx != -1:
+                return min(idx + len(separator), end)
+        return next_start
+
+    def _make_chunk(self, state, text, offset):
+        """建立 Document，並加上來源、頁碼、字元位置與標題元數據。"""
+        start_index = state.base_offset + offset
+        metadata = {'source': state.source, 'page': state.page_at(start_index), 'start_index': start_index}
+        metadata.update(state.header_metadata())
+        if metadata['source'] is None:
+            del metadata['source']
+        if metadata['page'] is None:
+            del metadata['page']
+
+        content = text.strip()
+        if self.include_headers_in_content and state.headers:
+            content = " > ".join(title for _, title in state.headers) + "\n" + content
+        return Document(page_content=content, metadata=metadata)
+
+
+class _ChunkState:
+    """TextChunker 在單一來源文件內的拆分狀態。"""
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, source):
+        self.source = source
+        self.buffer = []
+        self.base_offset = 0        # 緩衝區開頭在原文件中的字元位置
+        self.total_length = 0       # 已讀取的字元總數
+        self.page_offsets = []      # 每頁起始字元位置
+        self.page_numbers = []
+        self.headers = []           # [(層級, 標題)]
+
+    def mark_page(self, page):
+        self.page_offsets.append(self.total_length)
+        self.page_numbers.append(page)
+
+    def append(self, text):
+        self.buffer.append(text)
+        self.total_length += len(text)
+
+    def skip(self, length):
+        """略過不放入內容的文字（例如標題行），呼叫前緩衝區必須已清空。"""
+        self.total_length += length
+        self.base_offset = self.total_length
+
+    def consume(self, text, pos):
+        """移除已拆分的內容，保留 pos 之後的部分。"""
+        rest = text[pos:]
+        self.buffer = [rest] if rest else []
+        self.base_offset += pos
+
+    def set_header(self, level, title):
+        self.headers = [(lvl, t) for lvl, t in self.headers if lvl < level]
+        self.headers.append((level, title))
+
+    def header_metadata(self):
+        return {f"Header {level}": title for level, title in self.headers}
+
+    def page_at(self, offset):
+        if not self.page_offsets:
+            return None
+        idx = bisect.bisect_right(self.page_offsets, offset) - 1
+        return self.page_numbers[max(idx, 0)]
@@ -0,0 +1,125 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from langchain_chroma import Chroma
+
+os.environ["CHROMA_TELEMETRY"] = "False"
+
+logging.basicConfig(level=logging.INFO)
+
+
+class VectorStoreCache:
+    """
+    行程內共用的 Chroma 向量資料庫快取，鍵值為 vector_store_dir。
+
+    第一次查詢時開啟向量資料庫，之後的查詢重複使用同一個實例，不必每次重新開啟 SQLite 與載入索引。
+    開啟數量超過 max_entries，或以磁碟大小估計的總記憶體超過 max_bytes 時，淘汰最久未使用的實例；
+    DocumentModel 寫入新的文檔塊後呼叫 invalidate，下一次查詢會重新開啟；
+    由其他行程寫入的向量資料庫（例如以 CLI 建立的共用知識庫）則以 version 判斷是否需要重新開啟。
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """
+        參數:
+            max_entries (int, optional): 最多保留的向量資料庫數量，預設讀取環境變數 VECTOR_STORE_CACHE_SIZE（預設 16）。
+            max_bytes (int, optional): 估計記憶體上限，預設讀取環境變數 VECTOR_STORE_CACHE_BYTES（預設 2 GiB）。
+        """
+        self.max_entries = max_entries or int(os.getenv("VECTOR_STORE_CACHE_SIZE", "16"))
+        self.max_bytes = max_bytes or int(os.getenv("VECTOR_STORE_CACHE_BYTES", str(2 * 1024 ** 3)))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(vector_store_dir):
+        return os.path.abspath(str(vector_store_dir))
+
+    @staticmethod
+    def _estimate_bytes(vector_store_dir):
+        """以向量資料庫目錄的磁碟大小估計載入後的記憶體用量。"""
+        total = 0
+        for root, _, files in os.walk(vector_store_dir):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def _release_chroma_system(key):
+        """
+        Chroma 在行程內以路徑共用同一個 System（含已載入的向量索引），只移除快取中的實例不會釋放記憶體，
+        也看不到其他行程寫入的向量；移除 System 後，最後一個舊實例被回收時才釋放記憶體，下一次開啟會重新載入。
+        已取得的舊實例仍可完成進行中的查詢與寫入。
+        """
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient._identifier_to_system.pop(key, None)
+        getattr(SharedSystemClient, '_identifier_to_refcount', {}).pop(key, None)
+
+    def get(self, vector_store_dir, embedding_function, version=None):
+        """
+        取得向量資料庫，快取中沒有、embedding 模型不同或 version 改變時重新開啟。
+
+        參數:
+            vector_store_dir (Path): 向量資料庫目錄。
+            embedding_function (Embeddings): 查詢用的 embedding 模型。
+            version (optional): 向量資料庫內容的版本（例如 ingest manifest 的修改時間），
+                由其他行程寫入的向量資料庫以此判斷快取是否過期。
+        """
+        key = self._key(vector_store_dir)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['embedding_function'] is embedding_function and entry['version'] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['vector_db']
+
+        if entry is not None and entry['version'] != version:
+            logging.info(f"Vector store {key} changed on disk, reopening")
+            self._release_chroma_system(key)
+        vector_db = Chroma(embedding_function=embedding_function, persist_directory=key)
+        nbytes = self._estimate_bytes(key)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = {'vector_db': vector_db, 'embedding_function': embedding_function,
+                                  'version': version, 'nbytes': nbytes}
+            self._entries.move_to_end(key)
+            self._evict()
+        return vector_db
+
+    def invalidate(self, vector_store_dir):
+        """向量資料庫內容變更後移除快取。"""
+        with self._lock:
+            key = self._key(vector_store_dir)
+            self._entries.pop(key, None)
+            self._release_chroma_system(key)
+
+    def _evict(self):
+        total_bytes = sum(entry['nbytes'] for entry in self._entries.values())
+        # 至少保留剛開啟的實例
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or total_bytes > self.max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            total_bytes -= entry['nbytes']
+            self._release_chroma_system(key)
+            logging.info(f"Evicted vector store {key} from cache")
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                    'bytes': sum(entry['nbytes'] for entry in self._entries.values())}
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_vector_store_cache():
+    """取得行程內共用的 VectorStoreCache 實例。"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = VectorStoreCache()
+        return _shared_cache
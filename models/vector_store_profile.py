@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+from apis.embedding_api import EmbeddingAPI
+from apis.embedding_profiles import EmbeddingProfile
+
+os.environ["CHROMA_TELEMETRY"] = "False"
+
+logging.basicConfig(level=logging.INFO)
+
+# 同一行程內對 embedding_profile.json 的讀寫鎖
+_profile_lock = threading.Lock()
+
+
+class VectorStoreProfile:
+    """
+    記錄向量資料庫建立時使用的 embedding 輸出維度（向量資料庫目錄下的 embedding_profile.json）。
+
+    text-embedding-3 可縮減輸出維度，但同一個 Chroma collection 的向量維度必須一致，
+    查詢與後續寫入都要沿用建立時的維度。縮減維度只套用於新建立的向量資料庫；
+    沒有紀錄的舊向量資料庫從 collection 中已存在的向量偵測維度。
+    """
+
+    FILE_NAME = 'embedding_profile.json'
+
+    def __init__(self, vector_store_dir):
+        """
+        參數:
+            vector_store_dir (Path): Chroma 向量資料庫目錄。
+        """
+        self.vector_store_dir = vector_store_dir
+        self.profile_path = vector_store_dir.joinpath(self.FILE_NAME)
+
+    def load(self):
+        """讀取紀錄，檔案不存在時返回空紀錄。"""
+        if not self.profile_path.exists():
+            return {}
+        try:
+            with open(self.profile_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Error reading embedding profile {self.profile_path}: {e}")
+            return {}
+
+    def _record(self, embedding, dimensions):
+        """先寫入暫存檔再取代，避免寫入中斷造成紀錄損毀。"""
+        with _profile_lock:
+            profile = {**self.load(), embedding: dimensions}
+            self.vector_store_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.profile_path.with_suffix('.json.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.profile_path)
+
+    def _detect_dimensions(self):
+        """讀取 collection 中的一個向量取得維度，沒有向量時返回 None。"""
+        if not self.vector_store_dir.joinpath('chroma.sqlite3').exists():
+            return None
+        from langchain_chroma import Chroma
+        try:
+            vector_db = Chroma(persist_directory=self.vector_store_dir.as_posix())
+            embeddings = vector_db._collection.get(limit=1, include=['embeddings'])['embeddings']
+        except Exception as e:
+            logging.error(f"Error detecting embedding dimensions of {self.vector_store_dir}: {e}")
+            return None
+        return len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+
+    def _resolve(self, embedding, new_store_dimensions):
+        if not EmbeddingProfile.supports_dimensions(embedding):
+            return None
+        profile = self.load()
+        if embedding in profile:
+            return profile[embedding]
+
+        detected = self._detect_dimensions()
+        if detected is not None:
+            dimensions = EmbeddingProfile.for_model(embedding, detected).dimensions
+            logging.info(f"Detected {embedding} dimensions {detected} for {self.vector_store_dir}")
+        elif new_store_dimensions is not None:
+            dimensions = new_store_dimensions()
+        else:
+            return None
+        self._record(embedding, dimensions)
+        return dimensions
+
+    def dimensions(self, embedding):
+        """
+        查詢時使用的輸出維度，None 為模型原生維度。
+
+        優先使用紀錄；沒有紀錄時偵測已存在的向量並補上紀錄；向量資料庫尚無向量時返回 None。
+        """
+        return self._resolve(embedding, None)
+
+    def dimensions_for_ingest(self, embedding):
+        """
+        寫入時使用的輸出維度：已有向量時沿用原本的維度，新的向量資料庫依
+        EmbeddingProfile.new_store_dimensions 決定並記錄。
+        """
+        return self._resolve(embedding, lambda: EmbeddingProfile.new_store_dimensions(embedding))
+
+
+def get_store_embedding_function(vector_store_dir, mode, embedding):
+    """取得與向量資料庫建立時維度相同的 embedding 客戶端（查詢用，尚無向量時不決定維度）。"""
+    dimensions = VectorStoreProfile(vector_store_dir).dimensions(embedding)
+    return EmbeddingAPI.get_embedding_function(mode, embedding, dimensions)
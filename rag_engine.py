@@ -1,4 +1,6 @@
+import threading
 import streamlit as st
+from apis.embedding_api import EmbeddingAPI
 from views.login_page import LoginPage
 from views.main_page import MainPage
 from views.register_page import RegisterPage
@@ -6,8 +8,18 @@ from views.register_page import RegisterPage
 # 設定 Streamlit 頁面配置
 st.set_page_config(page_title="南亞塑膠GenAI")
 
+
+@st.cache_resource
+def warmup_embedding_models():
+    """每個行程只執行一次：在背景預熱 embedding 模型，不阻塞頁面載入。"""
+    thread = threading.Thread(target=EmbeddingAPI.warmup, name='embedding-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
 def main():
     """主函數，用於控制應用的流程"""
+    warmup_embedding_models()
     if not st.session_state.get('authentication_status'):
         choice = st.sidebar.selectbox("選擇頁面", ["登入", "註冊"])
 
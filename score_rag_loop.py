@@ -10,6 +10,7 @@ class RagTest:
 
     # 配置檔案路徑
     QA_ORIG_PATH = './mockdata/QAData.csv'  # 原始問題檔案路徑
+    CONCURRENCY = 4  # 同時回答的問題數量
 
     # 初始化 session 狀態參數，並儲存到 chat_session_data 字典中
     chat_session_data = {
@@ -33,6 +34,7 @@ class RagTest:
         'db_name': '',
         'db_source': '',
         'chat_history': [],
+        'semantic_cache': False,  # 評估每次都重新檢索與生成，不使用快取的答案
         'title': '',
         'upload_time': None,
         'username': "n000191032",  # 設置使用者名稱
@@ -53,7 +55,12 @@ class RagTest:
 
         # 使用 RAG 模型回答問題
         print("開始生成回答...")
-        df['Test'], df['Docs'] = zip(*df['Question'].apply(lambda query: llm_rag.query_llm_rag(query)))
+        results = llm_rag.query_many(df['Question'].tolist(), concurrency=RagTest.CONCURRENCY)
+        df['Test'] = [result['answer'] for result in results]
+        df['Docs'] = [result['documents'] for result in results]
+        df['Error'] = [result['error'] for result in results]
+        df['RetrievalSeconds'] = [result['retrieval_seconds'] for result in results]
+        df['GenerationSeconds'] = [result['generation_seconds'] for result in results]
 
         # 將結果存入中間結果檔案
         print("儲存中間結果檔案...")
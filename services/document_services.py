@@ -1,6 +1,8 @@
 from models.document_model import DocumentModel
 from models.database_userRecords import UserRecordsDB
 from models.database_devOps import DevOpsDB
+from services.ingest_pipeline import IngestPipeline
+from pathlib import Path
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -10,37 +12,63 @@ class DocumentService:
         self.chat_session_data = chat_session_data
 
     def process_uploaded_documents(self, source_docs):
-        doc_model = DocumentModel(self.chat_session_data)
         try:
-            # 建立臨時文件
-            doc_names = doc_model.create_temporary_files(source_docs)
-            self.chat_session_data['doc_names'] = doc_names
+            return self.ingest(source_docs)
+
+        except Exception as e:
+            # 處理文檔時發生錯誤，顯示錯誤訊息
+            logging.error(f"處理文檔時發生錯誤 process_uploaded_documents：{e}")
+
+    def ingest(self, source_docs, cancel_event=None, progress_callback=None):
+        """
+        處理上傳的文件並寫入本地向量數據庫，發生錯誤時直接拋出例外。
+
+        參數:
+            source_docs (list): 上傳的文件列表，每個元素包含 name 與 content。
+            cancel_event (threading.Event, optional): 設定後停止處理。
+            progress_callback (callable, optional): 以各階段處理數量回報進度。
+        """
+        doc_model = DocumentModel(self.chat_session_data)
 
-            # 加載文檔
-            documents = doc_model.load_documents()
+        # 建立臨時文件
+        doc_names = doc_model.create_temporary_files(source_docs)
+        self.chat_session_data['doc_names'] = doc_names
 
-            # 刪除臨時文件
-            # doc_model.delete_temporary_files()
+        # 只處理本次上傳且尚未寫入向量數據庫的文件
+        pending_files = doc_model.list_pending_files(file_names=doc_names)
+        if not pending_files:
+            logging.info("沒有新的文件需要處理")
+            return self.chat_session_data
 
-            # 將文檔拆分成塊
-            document_chunks = doc_model.split_documents_into_chunks_1(documents)
+        # 以串流管線依序解析、拆分、嵌入並寫入本地向量數據庫
+        pipeline = IngestPipeline(doc_model, cancel_event=cancel_event, progress_callback=progress_callback)
+        try:
+            pipeline.run(list(pending_files), file_hashes=pending_files)
+        except Exception:
+            # 取消或失敗時刪除本次的暫存文件，避免之後的上傳將其一併寫入
+            doc_model.delete_temporary_files([doc_model.tmp_dir.joinpath(name) for name in doc_names])
+            raise
 
-            # 在本地向量數據庫中嵌入文檔塊
-            doc_model.embeddings_on_local_vectordb(document_chunks)
+        # 記錄已處理的文件，下次上傳時略過
+        for file_path, file_hash in pending_files.items():
+            tmp_name = Path(file_path).name
+            doc_model.manifest.mark_indexed(
+                file_hash, tmp_name, doc_names.get(tmp_name, tmp_name),
+                pipeline.file_chunks.get(file_hash, 0)
+            )
 
-            # 存入 userRecords_db
-            username = self.chat_session_data.get('username')
-            userRecords_db = UserRecordsDB(username)
-            userRecords_db.save_to_file_names(self.chat_session_data)
-            userRecords_db.save_to_pdf_uploads(self.chat_session_data)
+        # 刪除臨時文件
+        # doc_model.delete_temporary_files()
 
-            # 存入 devOps_db
-            devOps_db = DevOpsDB()
-            devOps_db.save_to_file_names(self.chat_session_data)
-            devOps_db.save_to_pdf_uploads(self.chat_session_data)
+        # 存入 userRecords_db
+        username = self.chat_session_data.get('username')
+        userRecords_db = UserRecordsDB(username)
+        userRecords_db.save_to_file_names(self.chat_session_data)
+        userRecords_db.save_to_pdf_uploads(self.chat_session_data)
 
-            return self.chat_session_data
+        # 存入 devOps_db
+        devOps_db = DevOpsDB()
+        devOps_db.save_to_file_names(self.chat_session_data)
+        devOps_db.save_to_pdf_uploads(self.chat_session_data)
 
-        except Exception as e:
-            # 處理文檔時發生錯誤，顯示錯誤訊息
-            logging.error(f"處理文檔時發生錯誤 process_uploaded_documents：{e}")
\ No newline at end of file
+        return self.chat_session_data
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from models.database_ingestJobs import IngestJobsDB, ACTIVE_JOB_STATUSES
+from services.document_services import DocumentService
+from services.ingest_pipeline import IngestCancelled
+
+logging.basicConfig(level=logging.INFO)
+
+
+class IngestJobManager:
+    """
+    背景文件處理工作佇列。
+
+    上傳的文件以背景工作執行，狀態 (queued / parsing / embedding / done / failed / cancelled)
+    與各階段處理數量持久化於 IngestJobsDB，頁面可輪詢進度並取消工作。
+    不同對話的工作在 max_workers 的額度內平行處理，同一對話的工作依序處理，
+    避免同時寫入同一個向量資料庫與 ingest manifest。
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_workers=None):
+        """
+        參數:
+            max_workers (int, optional): 同時執行的工作數量，預設讀取環境變數 INGEST_MAX_WORKERS（預設 2）。
+        """
+        self.max_workers = max_workers or int(os.getenv("INGEST_MAX_WORKERS", "2"))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest-job')
+        self.jobs_db = IngestJobsDB()
+        self._cancel_events = {}
+        self._conversation_locks = {}
+        self._lock = threading.Lock()
+
+        # 服務重新啟動前未完成的工作已無法繼續
+        self.jobs_db.fail_interrupted_jobs()
+
+    @classmethod
+    def get_instance(cls):
+        """取得行程內共用的 IngestJobManager。"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def submit(self, chat_session_data, source_docs):
+        """提交文件處理工作並返回 job_id。"""
+        job_id = str(uuid.uuid4())
+        # 複製 chat_session_data，避免背景執行緒與頁面同時修改
+        job_session_data = dict(chat_session_data)
+        # 平行工作共用 CPU，每個工作的解析行程數依額度分配
+        job_session_data.setdefault('parse_workers', max(1, (os.cpu_count() or 1) // self.max_workers))
+
+        self.jobs_db.create_job(
+            job_id,
+            job_session_data.get('username'),
+            job_session_data.get('conversation_id'),
+            len(source_docs)
+        )
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._run_job, job_id, job_session_data, source_docs)
+        logging.info(f"已提交文件處理工作 {job_id}，共 {len(source_docs)} 個文件")
+        return job_id
+
+    def cancel(self, job_id):
+        """取消排隊中或執行中的工作。"""
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        return True
+
+    def get_status(self, job_id):
+        """取得工作的狀態與進度。"""
+        return self.jobs_db.get_job(job_id)
+
+    @staticmethod
+    def is_active(job):
+        """判斷工作是否尚未結束。"""
+        return bool(job) and job.get('status') in ACTIVE_JOB_STATUSES
+
+    def _conversation_lock(self, conversation_id):
+        with self._lock:
+            return self._conversation_locks.setdefault(conversation_id, threading.Lock())
+
+    def _run_job(self, job_id, chat_session_data, source_docs):
+        """在背景執行緒中執行文件處理工作。"""
+        cancel_event = self._cancel_events[job_id]
+        try:
+            with self._conversation_lock(chat_session_data.get('conversation_id')):
+                if cancel_event.is_set():
+                    raise IngestCancelled("文件處理已取消")
+                self.jobs_db.update_job(job_id, status='parsing')
+
+                def on_progress(stats):
+                    status = 'embedding' if stats.get('embedded') else 'parsing'
+                    self.jobs_db.update_job(job_id, status=status, stats=stats)
+
+                DocumentService(chat_session_data).ingest(
+                    source_docs, cancel_event=cancel_event, progress_callback=on_progress)
+            self.jobs_db.update_job(job_id, status='done')
+            logging.info(f"文件處理工作 {job_id} 已完成")
+
+        except IngestCancelled:
+            self.jobs_db.update_job(job_id, status='cancelled')
+            logging.info(f"文件處理工作 {job_id} 已取消")
+        except Exception as e:
+            self.jobs_db.update_job(job_id, status='failed', error=str(e))
+            logging.error(f"文件處理工作 {job_id} 發生錯誤：{e}")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
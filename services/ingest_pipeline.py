@@ -0,0 +1,222 @@
+import logging
+import queue
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+# 各階段之間傳遞的結束訊號
+_END = object()
+
+
+class IngestCancelled(Exception):
+    """文件處理工作被使用者取消。"""
+
+
+class IngestPipeline:
+    """
+    串流式文件處理管線：解析 → 拆分 → 嵌入 → 寫入向量資料庫。
+
+    每個階段在獨立執行緒中執行，階段之間以有界佇列連接，
+    記憶體用量只與佇列長度及批次大小有關，與上傳文件的總量無關；
+    每個批次寫入後即可被檢索，不需等待整批上傳處理完畢。
+    """
+
+    def __init__(self, doc_model, queue_size=4, embed_batch_size=64,
+                 cancel_event=None, progress_callback=None):
+        """
+        參數:
+            doc_model (DocumentModel): 提供拆分、嵌入與寫入功能的文件模型。
+            queue_size (int): 每個階段之間佇列的最大長度。
+            embed_batch_size (int): 每次送往 embedding 模型的文檔塊數量。
+            cancel_event (threading.Event, optional): 設定後管線會停止並拋出 IngestCancelled。
+            progress_callback (callable, optional): 以 stats 字典為參數回報進度。
+        """
+        self.doc_model = doc_model
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.cancel_event = cancel_event
+        self.progress_callback = progress_callback
+        self._last_report = 0.0
+        self._report_lock = threading.Lock()
+        self.stats = {'pages': 0, 'chunks': 0, 'embedded': 0, 'upserted': 0}
+        # 每個文件（以內容雜湊表示）拆分出的文檔塊數量
+        self.file_chunks = {}
+        # 已清除舊文檔塊、開始寫入的文件雜湊
+        self._written_files = set()
+        self._abort = threading.Event()
+        self._errors = []
+
+    def run(self, file_paths, file_hashes=None):
+        """
+        執行管線並返回各階段處理數量的統計資料。
+
+        參數:
+            file_paths (list): 要處理的 PDF 文件路徑。
+            file_hashes (dict, optional): {檔案路徑: 內容雜湊}，提供時文檔塊會以
+                「雜湊-序號」作為 chunk_id，重複處理同一文件不會寫入重複向量。
+        """
+        self.file_hashes = file_hashes or {}
+        self.chunker = self.doc_model.get_text_chunker()
+        parser = self.doc_model.get_pdf_parser()
+        embedding_function = self.doc_model.get_embedding_function()
+        vector_db = self.doc_model.open_local_vectordb(embedding_function)
+
+        page_queue = queue.Queue(maxsize=self.queue_size)
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        vector_queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._run_stage, name='ingest-parse',
+                             args=(self._parse, file_paths, parser, page_queue)),
+            threading.Thread(target=self._run_stage, name='ingest-split',
+                             args=(self._split, page_queue, chunk_queue)),
+            threading.Thread(target=self._run_stage, name='ingest-embed',
+                             args=(self._embed, chunk_queue, embedding_function, vector_queue)),
+        ]
+        start_time = time.perf_counter()
+        for stage in stages:
+            stage.start()
+
+        # 寫入階段在目前執行緒執行
+        self._run_stage(self._upsert, vector_queue, vector_db)
+        for stage in stages:
+            stage.join()
+
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise IngestCancelled("文件處理已取消")
+        if self._errors:
+            raise self._errors[0]
+        self._report(force=True)
+        if not self.stats['upserted']:
+            raise ValueError("No document chunks to embed. Please check the PDF files.")
+
+        logging.info(f"Ingest pipeline finished in {time.perf_counter() - start_time:.2f}s: {self.stats}")
+        return self.stats
+
+    def _run_stage(self, stage, *args):
+        """執行單一階段，發生錯誤時通知其他階段停止。"""
+        try:
+            stage(*args)
+        except Exception as e:
+            logging.error(f"Ingest pipeline stage {stage.__name__} failed: {e}")
+            self._errors.append(e)
+            self._abort.set()
+
+    def _should_stop(self):
+        """管線發生錯誤或被取消時返回 True。"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            self._abort.set()
+        return self._abort.is_set()
+
+    def _report(self, force=False):
+        """回報目前進度，非強制回報時每 0.5 秒最多一次。"""
+        if self.progress_callback is None:
+            return
+        with self._report_lock:
+            now = time.monotonic()
+            if not force and now - self._last_report < 0.5:
+                return
+            self._last_report = now
+        try:
+            self.progress_callback(dict(self.stats))
+        except Exception as e:
+            logging.error(f"Ingest progress callback failed: {e}")
+
+    def _put(self, target_queue, item):
+        """放入有界佇列；若管線已中止則放棄等待。"""
+        while not self._should_stop():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source_queue):
+        """從佇列取出項目；若管線已中止則返回結束訊號。"""
+        while not self._should_stop():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _parse(self, file_paths, parser, page_queue):
+        """解析階段：逐頁產生 Document。"""
+        try:
+            for page in parser.iter_parse(file_paths, self.file_hashes):
+                if not self._put(page_queue, page):
+                    return
+                self.stats['pages'] += 1
+                self._report()
+        finally:
+            self._put(page_queue, _END)
+
+    def _split(self, page_queue, chunk_queue):
+        """拆分階段：以 TextChunker 串流拆分頁面，並依批次大小送往嵌入階段。"""
+        batch = []
+        try:
+            for chunk in self.chunker.iter_chunks(self._iter_queue(page_queue)):
+                self._assign_chunk_id(chunk)
+                batch.append(chunk)
+                self.stats['chunks'] += 1
+                if len(batch) >= self.embed_batch_size:
+                    if not self._put(chunk_queue, batch):
+                        return
+                    batch = []
+
+            if batch:
+                self._put(chunk_queue, batch)
+        finally:
+            self._put(chunk_queue, _END)
+
+    def _iter_queue(self, source_queue):
+        """將佇列轉換為生成器，收到結束訊號時停止。"""
+        while True:
+            item = self._get(source_queue)
+            if item is _END:
+                return
+            yield item
+
+    def _assign_chunk_id(self, chunk):
+        """為文檔塊加上文件雜湊與「雜湊-序號」格式的 chunk_id。"""
+        file_hash = self.file_hashes.get(chunk.metadata.get('source'))
+        if not file_hash:
+            return
+        index = self.file_chunks.get(file_hash, 0)
+        chunk.metadata['file_hash'] = file_hash
+        chunk.metadata['chunk_id'] = f"{file_hash}-{index}"
+        self.file_chunks[file_hash] = index + 1
+
+    def _embed(self, chunk_queue, embedding_function, vector_queue):
+        """嵌入階段：批次計算文檔塊的向量。"""
+        try:
+            while True:
+                batch = self._get(chunk_queue)
+                if batch is _END:
+                    break
+                vectors = embedding_function.embed_documents([chunk.page_content for chunk in batch])
+                if not self._put(vector_queue, (batch, vectors)):
+                    return
+                self.stats['embedded'] += len(batch)
+        finally:
+            self._put(vector_queue, _END)
+
+    def _upsert(self, vector_queue, vector_db):
+        """寫入階段：將每個批次寫入向量資料庫，寫入後即可被檢索。"""
+        while True:
+            item = self._get(vector_queue)
+            if item is _END:
+                break
+            batch, vectors = item
+            # 文件第一次寫入前清除重新處理前的文檔塊
+            new_files = {chunk.metadata['file_hash'] for chunk in batch
+                         if chunk.metadata.get('file_hash')} - self._written_files
+            if new_files:
+                self.doc_model.remove_file_chunks(vector_db, new_files)
+                self._written_files |= new_files
+            self.doc_model.upsert_embedded_chunks(vector_db, batch, vectors)
+            self.stats['upserted'] += len(batch)
+            self._report(force=True)
+            logging.info(f"Upserted {self.stats['upserted']} chunks into {self.doc_model.vector_store_dir}")
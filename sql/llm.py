@@ -1,8 +1,16 @@
 from langchain_openai import ChatOpenAI
+import openai
+from apis.endpoint_pool import EndpointPool
 # from langchain.llms import Ollama
 # from langchain_community.chat_models import ChatOllama
 
 def llm(model,openai_api_base):
     # llm = ChatOllama(base_url=openai_api_base, model=model)
-    llm = ChatOpenAI(api_key="ollama",model=model,base_url=openai_api_base)
+    # openai_api_base 為預設主機，可用環境變數 OLLAMA_HOSTS_<模型名稱> 加入其他提供相同模型的主機
+    # 連線失敗或主機回傳 5xx 時，在同一次請求內改送其他主機
+    pool = EndpointPool.for_model(model, [openai_api_base.rstrip('/').removesuffix('/v1')])
+    llm = pool.with_failover(
+        lambda host, callbacks: ChatOpenAI(api_key="ollama",model=model,base_url=f"{host}/v1",callbacks=callbacks),
+        exceptions_to_handle=(openai.APIConnectionError, openai.InternalServerError)
+    )
     return llm
\ No newline at end of file
@@ -8,7 +8,7 @@ import ast
 import re
 import os
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OllamaEmbeddings
+from apis.embedding_api import EmbeddingAPI
 VECTOR_DB_PATH = "sql/sql/vector_db.faiss"
 
 def save_vector_db(vector_db):
@@ -18,12 +18,14 @@ def save_vector_db(vector_db):
 def load_vector_db():
     """從檔案中載入向量資料庫"""
     if os.path.exists(VECTOR_DB_PATH):
-        return FAISS.load_local(VECTOR_DB_PATH, OllamaEmbeddings(base_url="http://10.5.61.81:11433", model="bge-m3"),allow_dangerous_deserialization=True)
+        # 主機池客戶端與建立索引時的 OllamaEmbeddings 使用相同前綴與 /api/embeddings，向量空間一致，索引不需重建
+        return FAISS.load_local(VECTOR_DB_PATH, EmbeddingAPI.get_embedding_function('內部LLM', 'bge-m3'),allow_dangerous_deserialization=True)
     return None
 
 def create_vector_db_from_texts(texts):
     """從文本生成向量資料庫"""
-    embeddings = OllamaEmbeddings(base_url="http://10.5.61.81:11433", model="bge-m3")
+    # bge-m3 由 EmbeddingAPI 的主機池分配到 11433 / 11438 中較空閒的主機
+    embeddings = EmbeddingAPI.get_embedding_function('內部LLM', 'bge-m3')
     
     vector_db = FAISS.from_texts(texts, embeddings)
     print("emb finish")
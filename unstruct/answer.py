@@ -2,6 +2,8 @@ from unstructured.partition.pdf import partition_pdf
 import os
 import uuid
 import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from IPython import display
 from unstructured.partition.pdf import partition_pdf
 from langchain.chat_models import ChatOpenAI
@@ -19,26 +21,117 @@ from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain.schema import Document
+from docstore import SQLiteDocStore
 
 def get_llm():
     api_base = 'http://10.5.61.81:11434'
     model = 'SimonPu/llama-3-taiwan-8b-instruct-dpo'
     return Ollama(base_url=api_base, model=model)
-def answer(question):
-    embedding_function = OllamaEmbeddings(base_url="http://10.5.61.81:11435", model="llama3")
-    vectorstore = FAISS.load_local("db", embeddings=embedding_function, allow_dangerous_deserialization=True)
-    # 使用加載的 vectorstore 進行相似度搜索
-    relevant_docs = vectorstore.similarity_search(question)
-    
-    # 其餘邏輯和之前相同
+class FAISSIndexHolder:
+    """
+    常駐的 FAISS 索引與 docstore。
+
+    第一次查詢時才載入索引，之後重複使用；索引檔案的修改時間改變（重新執行 un.py）時自動重新載入，
+    每個問題只需付出 embedding 與搜尋的時間。
+    """
+
+    INDEX_FILES = ("index.faiss", "index.pkl")
+
+    def __init__(self, index_dir="db", embedding_function=None, k=4, embed_concurrency=4):
+        """
+        參數:
+            index_dir (str): FAISS 索引與 docstore 所在的目錄。
+            embedding_function (Embeddings, optional): 預設為內部 llama3 embedding。
+            k (int): 每個問題取回的摘要數量。
+            embed_concurrency (int): 同時嵌入的問題數量。
+        """
+        self.index_dir = index_dir
+        self.embedding_function = embedding_function or OllamaEmbeddings(
+            base_url="http://10.5.61.81:11435", model="llama3")
+        self.k = k
+        self.embed_concurrency = embed_concurrency
+        self.docstore = SQLiteDocStore(os.path.join(index_dir, "docstore.db"))
+        self._vectorstore = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _index_mtime(self):
+        paths = [os.path.join(self.index_dir, name) for name in self.INDEX_FILES]
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"找不到 FAISS 索引 {', '.join(missing)}，請先執行 un.py 建立索引與 docstore")
+        return max(os.path.getmtime(path) for path in paths)
+
+    def _check_index_format(self, vectorstore):
+        """舊版索引的摘要沒有 doc_id，無法從 docstore 取回原始內容，需以 un.py 重新建立。"""
+        stored_docs = getattr(vectorstore.docstore, '_dict', {})
+        if stored_docs and not any('doc_id' in doc.metadata for doc in stored_docs.values()):
+            raise ValueError(f"{self.index_dir} 的 FAISS 索引為舊版格式（沒有 doc_id），請重新執行 un.py 建立索引")
+
+    def get_vectorstore(self):
+        """取得索引，檔案有更新時重新載入。"""
+        mtime = self._index_mtime()
+        with self._lock:
+            if self._vectorstore is None or mtime != self._mtime:
+                vectorstore = FAISS.load_local(self.index_dir, embeddings=self.embedding_function,
+                                               allow_dangerous_deserialization=True)
+                self._check_index_format(vectorstore)
+                self._vectorstore = vectorstore
+                self._mtime = mtime
+            return self._vectorstore
+
+    def _embed_questions(self, questions):
+        """
+        以 embed_query 嵌入所有問題（OllamaEmbeddings 會加上 query 前綴，與 similarity_search 一致）。
+
+        OllamaEmbeddings 每次請求只能嵌入一段文字，且 embed_documents 會改用 passage 前綴，
+        因此以最多 embed_concurrency 個執行緒並行呼叫 embed_query。
+        """
+        if len(questions) <= 1:
+            return [self.embedding_function.embed_query(question) for question in questions]
+        with ThreadPoolExecutor(max_workers=min(self.embed_concurrency, len(questions))) as executor:
+            return list(executor.map(self.embedding_function.embed_query, questions))
+
+    def search_many(self, questions):
+        """
+        在同一個已載入的索引上檢索多個問題，返回每個問題的原始文件列表。
+
+        所有問題先並行嵌入（見 _embed_questions），再逐題在索引上搜尋。
+        """
+        vectorstore = self.get_vectorstore()
+        results = []
+        for vector in self._embed_questions(questions):
+            summary_docs = vectorstore.similarity_search_by_vector(vector, k=self.k)
+            # 向量索引只含摘要，以 doc_id 從 docstore 取回原始文字與表格
+            doc_ids = list(dict.fromkeys(d.metadata['doc_id'] for d in summary_docs if 'doc_id' in d.metadata))
+            results.append([d for d in self.docstore.mget(doc_ids) if d is not None])
+        return results
+
+
+index_holder = FAISSIndexHolder("db")
+
+
+def build_context(relevant_docs):
     context = ""
     for d in relevant_docs:
         if d.metadata['type'] == 'text':
-            context += '[text]' + d.metadata['original_content']
+            context += '[text]' + d.page_content
         elif d.metadata['type'] == 'table':
-            context += '[table]' + d.metadata['original_content']
-    result = answer_chain.run({'context': context, 'question': question})
-    return result
+            context += '[table]' + d.page_content
+    return context
+
+
+def answer_many(questions):
+    """批次回答多個問題，共用同一個已載入的索引與 docstore。"""
+    relevant_docs_list = index_holder.search_many(questions)
+    return [
+        answer_chain.run({'context': build_context(relevant_docs), 'question': question})
+        for question, relevant_docs in zip(questions, relevant_docs_list)
+    ]
+
+
+def answer(question):
+    return answer_many([question])[0]
 
 answer_template = """
 Answer the question based only on the following context, which can include text, images and tables:
@@ -49,7 +142,7 @@ answer_chain = LLMChain(
     llm=get_llm(),
     prompt=PromptTemplate.from_template(answer_template)
 )
-result = answer("南亞塑膠工三廠")
-print(result)
-
 
+if __name__ == "__main__":
+    result = answer("南亞塑膠工三廠")
+    print(result)
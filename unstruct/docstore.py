@@ -0,0 +1,77 @@
+import json
+import os
+import sqlite3
+import threading
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+
+
+class SQLiteDocStore(BaseStore[str, Document]):
+    """
+    以 SQLite 存放原始元素內容的 docstore，供 MultiVectorRetriever 使用。
+
+    向量索引只存摘要與 doc_id，檢索後再以 doc_id 從這裡取回原始文字或表格，
+    FAISS 檔案因此不含原文，體積較小、載入較快。
+    """
+
+    def __init__(self, db_path="db/docstore.db"):
+        """
+        參數:
+            db_path (str): SQLite 檔案路徑，預設與 FAISS 索引放在同一目錄。
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        # 檢索可能在不同執行緒中進行，共用同一個連線並以鎖保護
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    page_content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            """)
+
+    def mget(self, keys):
+        """依 doc_id 取回原始文件，找不到的鍵值返回 None。"""
+        if not keys:
+            return []
+        with self._lock:
+            placeholders = ','.join('?' * len(keys))
+            rows = self._conn.execute(
+                f"SELECT doc_id, page_content, metadata FROM documents WHERE doc_id IN ({placeholders})",
+                list(keys)
+            ).fetchall()
+        found = {
+            doc_id: Document(page_content=page_content, metadata=json.loads(metadata))
+            for doc_id, page_content, metadata in rows
+        }
+        return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs):
+        """寫入或覆蓋原始文件。"""
+        rows = [
+            (key, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+            for key, doc in key_value_pairs
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, page_content, metadata) VALUES (?, ?, ?)",
+                rows
+            )
+
+    def mdelete(self, keys):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(key,) for key in keys])
+
+    def yield_keys(self, prefix=None):
+        with self._lock:
+            if prefix:
+                rows = self._conn.execute(
+                    "SELECT doc_id FROM documents WHERE doc_id LIKE ? ORDER BY doc_id", (prefix + '%',)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT doc_id FROM documents ORDER BY doc_id").fetchall()
+        for (doc_id,) in rows:
+            yield doc_id
@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+import tempfile
+from collections import Counter
+from pypdf import PdfReader, PdfWriter
+from unstructured.partition.pdf import partition_pdf
+from unstructured.chunking.title import chunk_by_title
+
+logging.basicConfig(level=logging.INFO)
+
+# 表格列：一行中有三個以上的數字欄位，或以多個空白分隔的欄位
+NUMERIC_TOKEN = re.compile(r'\d[\d,./:-]*')
+COLUMN_GAP = re.compile(r'\S\s{2,}\S')
+
+
+def _image_xobjects(page):
+    """返回頁面資源中的圖片 XObject：{名稱: 鍵值}，同一個圖片物件在各頁的鍵值相同。"""
+    try:
+        xobjects = page['/Resources']['/XObject']
+    except (KeyError, TypeError):
+        return {}
+    images = {}
+    for name in xobjects:
+        xobject = xobjects[name].get_object()
+        if xobject.get('/Subtype') != '/Image':
+            continue
+        reference = xobjects.raw_get(name)
+        key = getattr(reference, 'idnum', None)
+        images[name] = key if key is not None else (name, xobject.get('/Width'), xobject.get('/Height'))
+    return images
+
+
+def extract_page_features(page):
+    """
+    取得頁面文字與繪製的圖片。
+
+    返回:
+        tuple: (文字, [(圖片鍵值, 佔頁面面積的比例)])；圖片面積由繪製時的轉換矩陣計算。
+    """
+    image_xobjects = _image_xobjects(page)
+    page_area = abs(float(page.mediabox.width) * float(page.mediabox.height)) or 1.0
+    images = []
+
+    def visitor(operator, operands, cm, tm):
+        if operator == b'Do' and operands and operands[0] in image_xobjects:
+            # 圖片繪製在單位正方形上，面積即轉換矩陣的行列式
+            area = abs(cm[0] * cm[3] - cm[1] * cm[2])
+            images.append((image_xobjects[operands[0]], area / page_area))
+
+    try:
+        text = page.extract_text(visitor_operand_before=visitor) or ''
+    except Exception as e:
+        logging.warning(f"無法讀取頁面內容: {e}")
+        text, images = '', []
+    return text, images
+
+
+def classify_page(text, images, ignored_images=(), min_text_chars=50, table_line_ratio=0.3,
+                  min_image_area_ratio=0.05):
+    """
+    判斷單一頁面是否需要 hi_res 解析。
+
+    文字很少（可能是掃描頁）、含有較大的圖片，或有大量表格列的頁面返回 'hi_res'，其餘返回 'fast'。
+    佔頁面面積不到 min_image_area_ratio 的圖片，以及 ignored_images 中每頁重複的圖片（公司標誌、頁首圖案）不列入判斷。
+    """
+    if len(text.strip()) < min_text_chars:
+        return 'hi_res'
+
+    if any(area >= min_image_area_ratio and key not in ignored_images for key, area in images):
+        return 'hi_res'
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    table_lines = sum(1 for line in lines
+                      if len(NUMERIC_TOKEN.findall(line)) >= 3 or COLUMN_GAP.search(line))
+    if lines and table_lines / len(lines) >= table_line_ratio:
+        return 'hi_res'
+    return 'fast'
+
+
+def classify_pages(fname, repeated_image_ratio=0.5):
+    """
+    返回每一頁的解析策略列表，索引為頁碼 (從 0 開始)。
+
+    出現在至少 repeated_image_ratio 比例（且至少兩頁）頁面的同一個圖片視為裝飾圖片，不列入判斷。
+    """
+    reader = PdfReader(fname)
+    features = [extract_page_features(page) for page in reader.pages]
+    page_counts = Counter(key for _, images in features for key in {key for key, _ in images})
+    min_pages = max(2, repeated_image_ratio * len(features))
+    repeated_images = {key for key, count in page_counts.items() if count >= min_pages}
+    return [classify_page(text, images, repeated_images) for text, images in features]
+
+
+def partition_pdf_routed(fname, hi_res_model_name="yolox", **chunking_kwargs):
+    """
+    只將可能含有表格或複雜版面的頁面送往 hi_res，其餘頁面使用 fast 文字解析，
+    再依頁碼合併結果並以 chunk_by_title 分塊。
+
+    參數:
+        fname (str): PDF 檔名。
+        hi_res_model_name (str): hi_res 使用的版面模型。
+        chunking_kwargs: 傳給 chunk_by_title 的參數，例如 max_characters。
+    """
+    strategies = classify_pages(fname)
+    hi_res_pages = [i for i, strategy in enumerate(strategies) if strategy == 'hi_res']
+    logging.info(f"{fname}: {len(hi_res_pages)}/{len(strategies)} 頁使用 hi_res 解析")
+
+    hi_res_kwargs = {'strategy': 'hi_res', 'hi_res_model_name': hi_res_model_name,
+                     'infer_table_structure': True, 'extract_images_in_pdf': False}
+    if len(hi_res_pages) == len(strategies):
+        return chunk_by_title(partition_pdf(filename=fname, **hi_res_kwargs), **chunking_kwargs)
+    if not hi_res_pages:
+        return chunk_by_title(partition_pdf(filename=fname, strategy='fast'), **chunking_kwargs)
+
+    # 兩種策略各自只解析所屬的頁面
+    fast_pages = [i for i, strategy in enumerate(strategies) if strategy == 'fast']
+    elements = _partition_pages(fname, fast_pages, strategy='fast')
+    elements.extend(_partition_pages(fname, hi_res_pages, **hi_res_kwargs))
+
+    # 依頁碼合併，同一頁內保持原本的元素順序
+    elements.sort(key=lambda e: e.metadata.page_number or 0)
+    return chunk_by_title(elements, **chunking_kwargs)
+
+
+def _partition_pages(fname, page_indexes, **partition_kwargs):
+    """將指定頁面另存為暫存 PDF 後解析，並將頁碼對應回原文件。"""
+    reader = PdfReader(fname)
+    writer = PdfWriter()
+    for i in page_indexes:
+        writer.add_page(reader.pages[i])
+
+    fd, subset_path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer.write(f)
+        elements = partition_pdf(filename=subset_path, **partition_kwargs)
+    finally:
+        os.remove(subset_path)
+
+    for element in elements:
+        subset_page = element.metadata.page_number or 1
+        element.metadata.page_number = page_indexes[subset_page - 1] + 1
+        element.metadata.filename = os.path.basename(fname)
+    return elements
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain.prompts import PromptTemplate
+
+logging.basicConfig(level=logging.INFO)
+
+# 多個元素合併為一個提示詞時的外層模板，每個元素的提示詞以 [編號] 標示
+BATCH_PROMPT = """The following {count} requests are independent. Answer each one separately.
+Start each answer on its own line with the number of its request, e.g. [1], and answer all {count} requests.
+
+{requests}
+"""
+BATCH_ANSWER_PATTERN = re.compile(r'^\s*\[(\d+)\]\s*', re.MULTILINE)
+
+
+class ElementSummarizer:
+    """
+    以有限的並行數量摘要 unstructured 元素，並依元素內容的雜湊值快取摘要。
+
+    重新處理同一份文件時，已摘要過的元素直接由快取讀取，不再呼叫 LLM。
+    batch_size 大於 1 時，較短的元素每 batch_size 個合併為一個提示詞，減少請求次數，
+    適用於能在一次回答中依編號處理多個請求、且 context 足夠的模型；
+    回答無法依編號拆成相同數量的摘要時，該批元素改為逐一摘要。
+    """
+
+    def __init__(self, llm, prompt_template, model_name, cache_path="summary_cache.db", max_concurrency=4,
+                 batch_size=1, max_batch_chars=6000):
+        """
+        參數:
+            llm: LangChain 的 LLM 或 Chat 模型。
+            prompt_template (str): 含 {element_type} 與 {element} 的提示詞模板。
+            model_name (str): 模型名稱，作為快取鍵值的一部分。
+            cache_path (str): SQLite 快取檔案路徑。
+            max_concurrency (int): 同時送往 LLM 的請求數量。
+            batch_size (int): 每個提示詞最多合併的元素數量，1 表示每個元素各自一個提示詞。
+            max_batch_chars (int): 合併提示詞中元素文字的總字元數上限，超過上限的元素單獨摘要。
+        """
+        self.llm = llm
+        self.prompt = PromptTemplate.from_template(prompt_template)
+        self.chain = self.prompt | llm
+        self.prompt_template = prompt_template
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.batch_size = max(1, batch_size)
+        self.max_batch_chars = max_batch_chars
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._create_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    def _create_table(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    element_hash TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def _hash(self, element_type, text):
+        """快取鍵值包含模型與提示詞，更換任一項時會重新摘要。"""
+        key = '\x00'.join([self.model_name, self.prompt_template, element_type, text])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _get_cached(self, hashes):
+        hashes = list(hashes)
+        found = {}
+        with self._connect() as conn:
+            # SQLite 單一查詢的參數數量有限，分批查詢
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(
+                    f"SELECT element_hash, summary FROM summaries WHERE element_hash IN ({placeholders})",
+                    batch
+                ).fetchall())
+        return found
+
+    def _put_cached(self, element_hash, summary):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (element_hash, summary, created_at) VALUES (?, ?, ?)",
+                (element_hash, summary, time.time())
+            )
+
+    def _summarize_one(self, element_type, text, element_hash):
+        result = self.chain.invoke({'element_type': element_type, 'element': text})
+        summary = getattr(result, 'content', result)
+        # 每完成一個元素就寫入快取，中途失敗時已完成的摘要不會遺失
+        self._put_cached(element_hash, summary)
+        return summary
+
+    def _summarize_batch(self, batch):
+        """
+        以一個提示詞摘要多個元素，batch 為 [(element_hash, (element_type, text))]，返回 {element_hash: 摘要}。
+        """
+        if len(batch) == 1:
+            element_hash, (element_type, text) = batch[0]
+            return {element_hash: self._summarize_one(element_type, text, element_hash)}
+
+        requests = "\n\n".join(
+            f"[{number}]\n{self.prompt.format(element_type=element_type, element=text).strip()}"
+            for number, (_, (element_type, text)) in enumerate(batch, start=1)
+        )
+        result = self.llm.invoke(BATCH_PROMPT.format(count=len(batch), requests=requests))
+        answers = self._split_answers(getattr(result, 'content', result), len(batch))
+        if answers is None:
+            logging.warning(f"合併摘要的回答無法拆成 {len(batch)} 個，改為逐一摘要")
+            return {element_hash: self._summarize_one(element_type, text, element_hash)
+                    for element_hash, (element_type, text) in batch}
+
+        for (element_hash, _), summary in zip(batch, answers):
+            self._put_cached(element_hash, summary)
+        return {element_hash: summary for (element_hash, _), summary in zip(batch, answers)}
+
+    @staticmethod
+    def _split_answers(response, count):
+        """依 [編號] 拆分合併提示詞的回答，編號不完整或有空白回答時返回 None。"""
+        parts = BATCH_ANSWER_PATTERN.split(response)
+        answers = {}
+        for number, answer in zip(parts[1::2], parts[2::2]):
+            answers.setdefault(int(number), answer.strip())
+        if sorted(answers) != list(range(1, count + 1)) or not all(answers.values()):
+            return None
+        return [answers[number] for number in range(1, count + 1)]
+
+    def _make_batches(self, pending):
+        """將待摘要的元素依 batch_size 與 max_batch_chars 分組，超過字元上限的元素單獨一組。"""
+        batches, batch, batch_chars = [], [], 0
+        for element_hash, (element_type, text) in pending.items():
+            if batch and (len(batch) >= self.batch_size or batch_chars + len(text) > self.max_batch_chars):
+                batches.append(batch)
+                batch, batch_chars = [], 0
+            batch.append((element_hash, (element_type, text)))
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def summarize(self, items):
+        """
+        摘要多個元素。
+
+        參數:
+            items (list): (element_type, text) 的列表，element_type 為 'text' 或 'table'。
+
+        返回:
+            list: 與 items 順序相同的摘要列表。
+        """
+        hashes = [self._hash(element_type, text) for element_type, text in items]
+        summaries = self._get_cached(set(hashes))
+
+        # 同一內容只送出一次請求
+        pending = {}
+        for (element_type, text), element_hash in zip(items, hashes):
+            if element_hash not in summaries and element_hash not in pending:
+                pending[element_hash] = (element_type, text)
+        logging.info(f"摘要元素 {len(items)} 個，快取命中 {len(items) - len(pending)} 個")
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = [executor.submit(self._summarize_batch, batch) for batch in self._make_batches(pending)]
+                for future in futures:
+                    summaries.update(future.result())
+
+        return [summaries[element_hash] for element_hash in hashes]
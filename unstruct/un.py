@@ -15,29 +15,30 @@ from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain_openai import ChatOpenAI
 from langchain_community.llms import Ollama
 import streamlit as st
+from page_router import partition_pdf_routed
+from summarizer import ElementSummarizer
+from docstore import SQLiteDocStore
 
 output_path="image"
 fname = "test7.pdf"
-elements = partition_pdf(filename=fname,
-                         strategy='hi_res',
-                         hi_res_model_name="yolox",
-                         extract_images_in_pdf=False,
-                         infer_table_structure=True,
-                         chunking_strategy="by_title",
-                         max_characters=4000,
-                         new_after_n_chars=3800,
-                         combine_text_under_n_chars=2000,
-                         extract_image_block_output_dir=output_path,
+# 摘要使用的 LLM，同時作為摘要快取鍵值的一部分
+LLM_MODEL = 'SimonPu/llama-3-taiwan-8b-instruct-dpo'
+# 只有含表格或複雜版面的頁面使用 hi_res，其餘頁面使用 fast 文字解析
+elements = partition_pdf_routed(fname,
+                                hi_res_model_name="yolox",
+                                max_characters=4000,
+                                new_after_n_chars=3800,
+                                combine_text_under_n_chars=2000,
            )
 def get_llm():
     api_base = 'http://10.5.61.81:11434'
-    model = 'SimonPu/llama-3-taiwan-8b-instruct-dpo'
-    return Ollama(base_url=api_base, model=model)
+    return Ollama(base_url=api_base, model=LLM_MODEL)
 
 
 import os
 import uuid
 import base64
+import hashlib
 text_elements = []
 table_elements = []
 
@@ -48,20 +49,27 @@ summary_prompt = """
 Using English to summarize the following {element_type}: 
 {element}
 """
-summary_chain = LLMChain(
+summarizer = ElementSummarizer(
     llm=get_llm(),
-    prompt=PromptTemplate.from_template(summary_prompt)
+    prompt_template=summary_prompt,
+    model_name=LLM_MODEL,
+    max_concurrency=4,
+    # 較短的元素每 4 個合併為一個提示詞（合計不超過 max_batch_chars 字元，維持在 8k context 內）
+    batch_size=4
 )
 for e in elements:
     print(repr(e))
     if 'CompositeElement' in repr(e):
         text_elements.append(e.text)
-        summary = summary_chain.run({'element_type': 'text', 'element': e})
-        text_summaries.append(summary)
     elif 'Table' in repr(e):
         table_elements.append(e.text)
-        summary = summary_chain.run({'element_type': 'table', 'element': e})
-        table_summaries.append(summary)
+
+# 並行摘要所有元素，已摘要過的元素由快取讀取
+summaries = summarizer.summarize(
+    [('text', e) for e in text_elements] + [('table', e) for e in table_elements]
+)
+text_summaries = summaries[:len(text_elements)]
+table_summaries = summaries[len(text_elements):]
 
 
 print(table_elements)
@@ -72,43 +80,22 @@ print(table_summaries)
 
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain.schema import Document
-documents = []
-retrieve_contents = []
+# 向量索引只存摘要與 doc_id，原始內容存於 docstore；doc_id 以內容雜湊產生，重複的元素只索引一次
+docstore = SQLiteDocStore("db/docstore.db")
+summary_docs = {}
+original_docs = {}
+for element_type, elements_, summaries_ in (('text', text_elements, text_summaries),
+                                            ('table', table_elements, table_summaries)):
+    for e, s in zip(elements_, summaries_):
+        i = hashlib.sha256(f"{element_type}\x00{e}".encode('utf-8')).hexdigest()
+        summary_docs[i] = Document(page_content=s, metadata={'doc_id': i, 'type': element_type})
+        original_docs[i] = Document(page_content=e, metadata={'type': element_type})
 
-for e, s in zip(text_elements, text_summaries):
-    i = str(uuid.uuid4())
-    doc = Document(
-        page_content = s,
-        metadata = {
-            'id': i,
-            'type': 'text',
-            'original_content': e
-        }
-    )
-    retrieve_contents.append((i, e))
-    documents.append(doc)
-    print("1",retrieve_contents)
-    print("11111111111111",documents)
-    
-for e, s in zip(table_elements, table_summaries):
-    i = str(uuid.uuid4())
-    doc = Document(
-        page_content = s,
-        metadata = {
-            'id': i,
-            'type': 'table',
-            'original_content': e
-        }
-    )
-    retrieve_contents.append((i, e))
-    documents.append(doc)
-    print("2",retrieve_contents)
-    print("222222222222",documents)
-    retrieve_contents.append((i, s))
-    documents.append(doc)
+docstore.mset(list(original_docs.items()))
+# FAISS 索引每次重新建立，移除 docstore 中已不在索引內的元素
+docstore.mdelete([doc_id for doc_id in docstore.yield_keys() if doc_id not in original_docs])
 embedding_function = OllamaEmbeddings(base_url="http://10.5.61.81:11435", model="llama3")
-vectorstore = FAISS.from_documents(documents=documents, embedding=embedding_function)
+vectorstore = FAISS.from_documents(documents=list(summary_docs.values()), embedding=embedding_function,
+                                   ids=list(summary_docs))
 # 保存 vectorstore 到本地文件
 vectorstore.save_local("db")
-
-
@@ -1,5 +1,5 @@
 import streamlit as st
-from services.document_services import DocumentService
+from services.ingest_jobs import IngestJobManager
 
 class MainContent:
     def __init__(self, chat_session_data):
@@ -32,15 +32,70 @@ class MainContent:
             # 準備文件列表，包含文件名和內容
             source_docs = [{'name': file.name, 'content': file.read()} for file in uploaded_files] if uploaded_files else []
 
-            # 顯示提交按鈕，點擊時觸發 process_uploaded_documents 方法
+            # 顯示提交按鈕，點擊時將文件處理提交為背景工作
             if st.button("提交文件", key="submit", help="提交文件"):
-                try:
-                    self.chat_session_data = DocumentService(self.chat_session_data).process_uploaded_documents(source_docs)
-                except Exception as e:
-                    st.error(f"處理文檔時發生錯誤：{e}")
+                if not source_docs:
+                    st.warning("請先上傳文件")
+                else:
+                    try:
+                        job_id = IngestJobManager.get_instance().submit(self.chat_session_data, source_docs)
+                        self.chat_session_data.setdefault('ingest_job_ids', []).append(job_id)
+                    except Exception as e:
+                        st.error(f"處理文檔時發生錯誤：{e}")
+
+            # 顯示背景工作的進度；有未完成的工作時每 2 秒自動更新
+            self.display_ingest_jobs_status()
 
             st.write(f'此功能仍在測試階段...')  # 顯示測試階段提示
 
+    def display_ingest_jobs_status(self):
+        """顯示本對話文件處理工作的進度，並在有未完成的工作時定期輪詢。"""
+        job_ids = self.chat_session_data.get('ingest_job_ids', [])
+        if not job_ids:
+            return
+
+        manager = IngestJobManager.get_instance()
+        has_active_job = any(manager.is_active(manager.get_status(job_id)) for job_id in job_ids)
+        if hasattr(st, 'fragment'):
+            # 以 fragment 只重新執行進度區塊，不影響整個頁面
+            st.fragment(run_every=2 if has_active_job else None)(self._render_ingest_jobs)(polling=has_active_job)
+        else:
+            self._render_ingest_jobs()
+            if has_active_job:
+                st.button("更新進度", key="refresh_ingest_jobs")
+
+    def _render_ingest_jobs(self, polling=False):
+        """
+        顯示每個工作的狀態、各階段處理數量與取消按鈕。
+
+        參數:
+            polling (bool): 是否為定期輪詢的 fragment；所有工作結束後重新執行頁面以停止輪詢。
+        """
+        status_labels = {
+            'queued': '排隊中', 'parsing': '解析中', 'embedding': '嵌入中',
+            'done': '已完成', 'failed': '失敗', 'cancelled': '已取消'
+        }
+        manager = IngestJobManager.get_instance()
+        has_active_job = False
+        for job_id in self.chat_session_data.get('ingest_job_ids', []):
+            job = manager.get_status(job_id)
+            if not job:
+                continue
+            has_active_job = has_active_job or manager.is_active(job)
+
+            label = status_labels.get(job['status'], job['status'])
+            st.write(f"文件處理（{job['total_files']} 個文件）：{label}｜"
+                     f"頁數 {job['pages']}、文檔塊 {job['chunks']}、"
+                     f"已嵌入 {job['embedded']}、已寫入 {job['upserted']}")
+            if job['status'] == 'failed':
+                st.error(f"處理文檔時發生錯誤：{job['error']}")
+            elif manager.is_active(job):
+                if st.button("取消", key=f"cancel_{job_id}", help="取消文件處理"):
+                    manager.cancel(job_id)
+
+        if polling and not has_active_job:
+            st.rerun()
+
     def display_sql_example(self):
         """根據資料庫來源顯示 prompt"""
         db_source = self.chat_session_data.get('db_source')
@@ -47,6 +47,7 @@ class Sidebar:
             self.llm_selection()               # 顯示 LLM 模式選項
             if self.chat_session_data.get('agent') in ['個人KM']:
                 self.embedding_selection()     # 僅當助理類型為 '個人KM' 時顯示嵌入模型選項
+                self.shared_kb_selection()     # 顯示可引用的共用知識庫
             self.chat_history_buttons()        # 顯示聊天記錄按鈕
 
     def _set_sidebar_button_style(self):
@@ -125,6 +126,14 @@ class Sidebar:
         self.chat_session_data['embedding'] = embedding_options[0]  # 更新選擇的 embedding 模式
         self._create_selectbox('選擇嵌入模型：', 'embedding', embedding_options)  # 顯示對應的嵌入模型選項
 
+    def shared_kb_selection(self):
+        """顯示共用知識庫選項，選取的知識庫與本對話上傳的文件一起檢索"""
+        shared_kb_options = self.controller.list_shared_kbs()
+        if not shared_kb_options:
+            return
+        current_kbs = [kb for kb in self.chat_session_data.get('shared_kbs') or [] if kb in shared_kb_options]
+        self.chat_session_data['shared_kbs'] = st.multiselect('引用共用知識庫：', shared_kb_options, default=current_kbs)
+
     def chat_history_buttons(self):
         """顯示側邊欄中的聊天記錄"""
         st.title("聊天記錄")